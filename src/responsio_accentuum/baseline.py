@@ -60,6 +60,7 @@ PERFORMANCE OPTIMIZATION:
 
 from collections import defaultdict
 from concurrent.futures import ProcessPoolExecutor
+import copy
 import math
 import shutil
 from fractions import Fraction
@@ -105,6 +106,14 @@ EXTERNAL_MAX_PADDING = 4        # Max syllables to add to external corpus lines
 
 # =============================================================================
 
+# Precompiled XPath expressions, applied to every line of the lyric and external corpora
+_syll_all = etree.XPath(".//syll")
+_syll_canon = etree.XPath(".//syll[not(@resolution='True') and not(@anceps='True')]")
+_strophes_by_responsion = etree.XPath(".//strophe[@responsion=$rid]")
+
+# External corpus folder -> (file mtimes, lines by canonical length, canonical sylls), cf. _index_external_corpus
+_external_corpora = {}
+
 punctuation_except_period = r'[\u0387\u037e\u00b7,!?;:\"()\[\]{}<>«»\-—…|⏑⏓†×]'
 
 
@@ -414,7 +423,7 @@ def one_t_prose(seed_offset: int = 0, temp_dir: str | Path | None = None) -> tup
 
             tree = etree.parse(str(xml_file))
             root = tree.getroot()
-            strophes = root.findall(f".//strophe[@responsion='{responsion_id}']")
+            strophes = _strophes_by_responsion(root, rid=responsion_id)
             sample_size = len(strophes)
             if sample_size == 0:
                 continue
@@ -646,7 +655,7 @@ def make_prose_baseline(xml_file: str, responsion_id: str, debug: bool = False,
     # Count the number of strophes with the given responsion_id in the original file
     tree = etree.parse(str(xml_file))
     root = tree.getroot()
-    strophes = root.findall(f".//strophe[@responsion='{responsion_id}']")
+    strophes = _strophes_by_responsion(root, rid=responsion_id)
     sample_size = len(strophes)
     
     if debug:
@@ -720,6 +729,15 @@ def make_prose_baseline(xml_file: str, responsion_id: str, debug: bool = False,
         for i, line in enumerate(strophe_samples_dict[first_key][0]):
             print(f"  Line {i+1} (length {strophe_scheme[i]}): {line}")
 
+def _mark_anceps(line_element):
+    """
+    Add anceps="True" to syllables that don't have resolution or anceps attributes.
+    Done on the sampled element itself, to spare a serialize-and-reparse round trip per line.
+    """
+    for syll in _syll_all(line_element):
+        if syll.get("resolution") != "True" and syll.get("anceps") != "True":
+            syll.set("anceps", "True")
+
 def make_lyric_baseline(xml_file: str, responsion_id: str, corpus_folder: str = "data/compiled/triads", 
                            outfolder: str = "data/compiled/baselines/triads/lyric", 
                            cache_file: str = LYRIC_CACHE_PATH, randomizations=10_000, debug: bool = False, seed_base: int = 1453):
@@ -758,7 +776,7 @@ def make_lyric_baseline(xml_file: str, responsion_id: str, corpus_folder: str =
     # Count the number of strophes with the given responsion_id in the original file
     tree = etree.parse(str(xml_file))
     root = tree.getroot()
-    strophes = root.findall(f".//strophe[@responsion='{responsion_id}']")
+    strophes = _strophes_by_responsion(root, rid=responsion_id)
     sample_size = len(strophes)
     
     # Get the filename of the input XML to exclude from corpus sampling
@@ -841,7 +859,9 @@ def make_lyric_baseline(xml_file: str, responsion_id: str, corpus_folder: str =
                         # Add responsion to used set for this position
                         used_responsions_per_position[line_idx].add(responsion_from_source)
                         
-                        position_lines.append(line_text)
+                        # Uniqueness is judged on the line as sampled, but the anceps-marked version is what we keep
+                        _mark_anceps(sample_line)
+                        position_lines.append(etree.tostring(sample_line, encoding='unicode', method='xml'))
                         used_lines.add(line_text)
                     
                 attempts += 1
@@ -885,8 +905,8 @@ def make_lyric_baseline(xml_file: str, responsion_id: str, corpus_folder: str =
                         # Build combined line and trim from the beginning of the first
                         line1 = etree.fromstring(item1['xml'])
                         line2 = etree.fromstring(item2['xml'])
-                        sylls1 = line1.xpath(".//syll")
-                        sylls2 = line2.xpath(".//syll")
+                        sylls1 = _syll_all(line1)
+                        sylls2 = _syll_all(line2)
                         total_len = len(sylls1) + len(sylls2)
                         trim_needed = total_len - target_len
                         if trim_needed < 0 or trim_needed > len(sylls1):
@@ -927,7 +947,8 @@ def make_lyric_baseline(xml_file: str, responsion_id: str, corpus_folder: str =
                     if fallback_result is not None:
                         fallback_line, trim_needed = fallback_result
                         line_text = etree.tostring(fallback_line, encoding='unicode', method='xml')
-                        position_lines.append(line_text)
+                        _mark_anceps(fallback_line)
+                        position_lines.append(etree.tostring(fallback_line, encoding='unicode', method='xml'))
                         used_lines.add(line_text)
                         total_lines += 1
                         pindar_lines += 1
@@ -965,26 +986,7 @@ def make_lyric_baseline(xml_file: str, responsion_id: str, corpus_folder: str =
     filename = f"baseline_lyric_{responsion_id}.xml"
     filepath = outdir / filename
     
-    # Add anceps="True" to syllables that don't have resolution or anceps attributes
-    for responsion_key, strophe_sample_lists in strophe_samples_dict.items():
-        for strophe_idx, strophe_sample_list in enumerate(strophe_sample_lists):
-            for line_idx, line in enumerate(strophe_sample_list):
-                try:
-                    line_element = etree.fromstring(line)
-                    # Find all syllable elements
-                    for syll in line_element.xpath(".//syll"):
-                        # Check if syllable already has resolution="True" or anceps="True"
-                        if syll.get("resolution") != "True" and syll.get("anceps") != "True":
-                            syll.set("anceps", "True")
-                    
-                    # Convert back to string and update the list
-                    updated_line = etree.tostring(line_element, encoding='unicode', method='xml')
-                    strophe_samples_dict[responsion_key][strophe_idx][line_idx] = updated_line
-                    
-                except etree.XMLSyntaxError:
-                    # Skip malformed XML lines
-                    continue
-    
+    # NB anceps="True" has already been added to the sampled lines (see _mark_anceps)
     dummy_xml_strophe(strophe_samples_dict, str(filepath), type="Lyric")
 
     if debug:
@@ -1124,7 +1126,7 @@ def preprocess_and_cache_lyric_corpus(corpus_folder: str, cache_file: str = LYRI
         
         # Store syllables for this file (for fallback operations)
         file_syllables = []
-        for syll in root.xpath(".//syll[not(@resolution='True') and not(@anceps='True')]"):
+        for syll in _syll_canon(root):
             file_syllables.append(etree.tostring(syll, encoding='unicode', method='xml'))
         syllables_by_file[xml_file] = file_syllables
         
@@ -1363,7 +1365,7 @@ def lyric_line_sample_cached(length: int, cached_corpus: dict, seed=1453, debug=
                 
                 selected_xml = selected_item['xml']
                 line = etree.fromstring(selected_xml)
-                sylls = line.xpath(".//syll")  # Use all syllables, not just non-anceps/non-resolution
+                sylls = _syll_all(line)  # Use all syllables, not just non-anceps/non-resolution
                 if len(sylls) >= extra_length:
                     trimmed_sylls = sylls[:-extra_length]  # remove last syllables
                     
@@ -1395,6 +1397,62 @@ def lyric_line_sample_cached(length: int, cached_corpus: dict, seed=1453, debug=
         print(f"Warning: No lines found with lengths {length}, {length+1}, {length-1}, {length-2}, or in external corpus.")
     return None
 
+def _index_external_corpus(corpus_folder: Path, xml_files: list, debug=False):
+    """
+    Parse the external corpus once per process, grouping the metadata of every line by canonical length
+    (in the format of preprocess_and_cache_lyric_corpus) and keeping all canonical sylls for padding.
+    Every fallback search used to reparse and rescan all files; the index is only rebuilt when a file changes.
+
+    Returns:
+        tuple: dict canonical_length -> list of line metadata, list of syll elements
+    """
+    mtimes = tuple((xml_file, os.stat(corpus_folder / xml_file).st_mtime_ns) for xml_file in xml_files)
+    cached = _external_corpora.get(corpus_folder)
+    if cached is not None and cached[0] == mtimes:
+        return cached[1], cached[2]
+
+    lines_by_length = defaultdict(list)
+    external_syllables = []
+    for xml_file in xml_files:
+        try:
+            file_path = corpus_folder / xml_file
+            tree = etree.parse(str(file_path))
+            root = tree.getroot()
+
+            external_syllables.extend(_syll_canon(root))
+
+            # Find all strophes to extract proper responsion_ids
+            for canticum_idx, canticum in enumerate(root.findall(".//canticum")):
+                for strophe_idx, strophe in enumerate(canticum.findall(".//strophe")):
+                    responsion_id = strophe.get('responsion', 'unknown')
+
+                    for line_idx, l in enumerate(strophe.findall("l")):
+                        try:
+                            canonical_length = len(canonical_sylls(l))
+                            # Create metadata similar to cached corpus format
+                            line_metadata = {
+                                'xml': etree.tostring(l, encoding='unicode', method='xml'),
+                                'file': xml_file,
+                                'canticum_idx': canticum_idx,
+                                'strophe_idx': strophe_idx,
+                                'line_idx': line_idx,
+                                'responsion_id': responsion_id
+                            }
+                            lines_by_length[canonical_length].append(line_metadata)
+                        except:
+                            # Skip lines that cause errors in canonical_sylls
+                            continue
+
+        except:
+            # Skip files that can't be parsed
+            if debug:
+                print(f"Could not parse external file: {xml_file}")
+            continue
+
+    lines_by_length = dict(lines_by_length)
+    _external_corpora[corpus_folder] = (mtimes, lines_by_length, external_syllables)
+    return lines_by_length, external_syllables
+
 def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllables: list, exclude_file: str, used_metrical_positions: set, used_responsions_this_position: set, corpus_folder: str = "external/aristophanis-cantica/data/compiled/", debug=False):
     """
     Search external corpus (Aristophanes) for lines of given length.
@@ -1456,42 +1514,10 @@ def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllab
                 print(f"No XML files found in external corpus folder {corpus_folder}.")
             return None
         
+        external_lines_by_length, all_external_syllables = _index_external_corpus(corpus_folder, xml_files, debug)
+
         # Try exact length first
-        candidate_lines_with_metadata = []
-        for xml_file in xml_files:
-            try:
-                file_path = corpus_folder / xml_file
-                tree = etree.parse(str(file_path))
-                root = tree.getroot()
-                
-                # Find all strophes to extract proper responsion_ids 
-                for canticum_idx, canticum in enumerate(root.findall(".//canticum")):
-                    for strophe_idx, strophe in enumerate(canticum.findall(".//strophe")):
-                        responsion_id = strophe.get('responsion', 'unknown')
-                        
-                        for line_idx, l in enumerate(strophe.findall("l")):
-                            try:
-                                canonical_length = len(canonical_sylls(l))
-                                if canonical_length == length:
-                                    # Create metadata similar to cached corpus format
-                                    line_metadata = {
-                                        'xml': etree.tostring(l, encoding='unicode', method='xml'),
-                                        'file': xml_file,
-                                        'canticum_idx': canticum_idx,
-                                        'strophe_idx': strophe_idx, 
-                                        'line_idx': line_idx,
-                                        'responsion_id': responsion_id
-                                    }
-                                    candidate_lines_with_metadata.append(line_metadata)
-                            except:
-                                # Skip lines that cause errors in canonical_sylls
-                                continue
-                        
-            except:
-                # Skip files that can't be parsed
-                if debug:
-                    print(f"Could not parse external file: {xml_file}")
-                continue
+        candidate_lines_with_metadata = external_lines_by_length.get(length, [])
         
         if candidate_lines_with_metadata:
             # Apply same independence filtering as internal corpus
@@ -1522,38 +1548,8 @@ def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllab
         
         # Try external corpus length + 1 through + MAX and trim syllables
         for extra_length in range(1, EXTERNAL_MAX_TRIMMING + 1):
-            candidate_lines_with_metadata = []
             target_length = length + extra_length
-            
-            for xml_file in xml_files:
-                try:
-                    file_path = corpus_folder / xml_file
-                    tree = etree.parse(str(file_path))
-                    root = tree.getroot()
-                    
-                    # Find all strophes to extract proper responsion_ids
-                    for canticum_idx, canticum in enumerate(root.findall(".//canticum")):
-                        for strophe_idx, strophe in enumerate(canticum.findall(".//strophe")):
-                            responsion_id = strophe.get('responsion', 'unknown')
-                            
-                            for line_idx, l in enumerate(strophe.findall("l")):
-                                try:
-                                    canonical_length = len(canonical_sylls(l))
-                                    if canonical_length == target_length:
-                                        line_metadata = {
-                                            'xml': etree.tostring(l, encoding='unicode', method='xml'),
-                                            'file': xml_file,
-                                            'canticum_idx': canticum_idx,
-                                            'strophe_idx': strophe_idx,
-                                            'line_idx': line_idx,
-                                            'responsion_id': responsion_id
-                                        }
-                                        candidate_lines_with_metadata.append(line_metadata)
-                                except:
-                                    continue
-                        
-                except:
-                    continue
+            candidate_lines_with_metadata = external_lines_by_length.get(target_length, [])
             
             if candidate_lines_with_metadata:
                 # Apply independence filtering
@@ -1567,7 +1563,7 @@ def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllab
                     
                     selected_metadata = random.choice(filtered_lines)
                     line = etree.fromstring(selected_metadata['xml'])
-                    sylls = line.xpath(".//syll")  # Use all syllables, not just non-anceps/non-resolution
+                    sylls = _syll_all(line)  # Use all syllables, not just non-anceps/non-resolution
                     
                     if len(sylls) >= extra_length:
                         trimmed_sylls = sylls[:-extra_length]  # remove last syllables
@@ -1609,7 +1605,7 @@ def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllab
                     
                     selected_xml = selected_item['xml']
                     line = etree.fromstring(selected_xml)
-                    sylls = line.xpath(".//syll")  # Use all syllables, not just non-anceps/non-resolution
+                    sylls = _syll_all(line)  # Use all syllables, not just non-anceps/non-resolution
                     
                     # Filter syllables to exclude those from the excluded file
                     available_syllables = all_syllables
@@ -1640,54 +1636,11 @@ def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllab
                     return new_line
         
         # Try external corpus with padding (length - 1 through length - MAX_PADDING)
-        all_external_syllables = []
         for padding_amount in range(1, EXTERNAL_MAX_PADDING + 1):
-            candidate_lines_with_metadata = []
             target_length = length - padding_amount
             
-            # Collect syllables if not done already
-            if not all_external_syllables:
-                for xml_file in xml_files:
-                    try:
-                        file_path = corpus_folder / xml_file
-                        tree = etree.parse(str(file_path))
-                        root = tree.getroot()
-                        
-                        for syll in root.xpath(".//syll[not(@resolution='True') and not(@anceps='True')]"):
-                            all_external_syllables.append(syll)
-                            
-                    except:
-                        continue
-            
             # Find candidate lines of target length with proper metadata
-            for xml_file in xml_files:
-                try:
-                    file_path = corpus_folder / xml_file
-                    tree = etree.parse(str(file_path))
-                    root = tree.getroot()
-                    
-                    for canticum_idx, canticum in enumerate(root.findall(".//canticum")):
-                        for strophe_idx, strophe in enumerate(canticum.findall(".//strophe")):
-                            responsion_id = strophe.get('responsion', 'unknown')
-                            
-                            for line_idx, l in enumerate(strophe.findall("l")):
-                                try:
-                                    canonical_length = len(canonical_sylls(l))
-                                    if canonical_length == target_length:
-                                        line_metadata = {
-                                            'xml': etree.tostring(l, encoding='unicode', method='xml'),
-                                            'file': xml_file,
-                                            'canticum_idx': canticum_idx,
-                                            'strophe_idx': strophe_idx,
-                                            'line_idx': line_idx,
-                                            'responsion_id': responsion_id
-                                        }
-                                        candidate_lines_with_metadata.append(line_metadata)
-                                except:
-                                    continue
-                        
-                except:
-                    continue
+            candidate_lines_with_metadata = external_lines_by_length.get(target_length, [])
             
             if candidate_lines_with_metadata and len(all_external_syllables) >= padding_amount:
                 # Apply independence filtering
@@ -1701,11 +1654,11 @@ def search_external_corpus_for_line(length: int, cached_corpus: dict, all_syllab
                     
                     selected_metadata = random.choice(filtered_lines)
                     line = etree.fromstring(selected_metadata['xml'])
-                    sylls = line.xpath(".//syll")  # Use all syllables, not just non-anceps/non-resolution
+                    sylls = _syll_all(line)  # Use all syllables, not just non-anceps/non-resolution
                     
                     # Append required number of random syllables from external corpus
                     for i in range(padding_amount):
-                        random_syllable = random.choice(all_external_syllables)
+                        random_syllable = copy.deepcopy(random.choice(all_external_syllables)) # the indexed sylls are shared between calls
                         sylls.append(random_syllable)
                     
                     # Create new <l> element
@@ -1748,7 +1701,7 @@ def dummy_xml_single_line(string_list: list, outfile: str):
     Generate TEI XML from a list of strings, with each string in an <l> element
     nested inside its own <strophe> element.
     """
-    xml_content = '''<?xml version='1.0' encoding='UTF-8'?>
+    xml_parts = ['''<?xml version='1.0' encoding='UTF-8'?>
 <TEI>
   <teiHeader>
     <fileDesc>
@@ -1761,21 +1714,21 @@ def dummy_xml_single_line(string_list: list, outfile: str):
   <text>
     <body>
       <canticum>
-'''
+''']
     
     for i, text in enumerate(string_list, 1):
-        xml_content += f'''        <strophe type="strophe" responsion="ba01">
+        xml_parts.append(f'''        <strophe type="strophe" responsion="ba01">
           <l n="{i}">{text}</l>
         </strophe>
-'''
+''')
     
-    xml_content += '''      </canticum>
+    xml_parts.append('''      </canticum>
     </body>
   </text>
-</TEI>'''
+</TEI>''')
     
     with open(outfile, 'w', encoding='utf-8') as f:
-        f.write(xml_content)
+        f.write("".join(xml_parts))
 
 def dummy_xml_strophe(strophe_sample_lists_dict, outfile, type="Prose"):
     """
@@ -1786,7 +1739,7 @@ def dummy_xml_strophe(strophe_sample_lists_dict, outfile, type="Prose"):
         outfile: output file path
         type: type of baseline (default "Prose")
     """
-    xml_content = f'''<?xml version='1.0' encoding='UTF-8'?>
+    xml_parts = [f'''<?xml version='1.0' encoding='UTF-8'?>
 <TEI>
   <teiHeader>
     <fileDesc>
@@ -1798,16 +1751,16 @@ def dummy_xml_strophe(strophe_sample_lists_dict, outfile, type="Prose"):
   </teiHeader>
   <text>
     <body>
-'''
+''']
     
     for responsion_id, strophe_sample_lists in strophe_sample_lists_dict.items():
-        xml_content += f'''      <canticum>
-'''
+        xml_parts.append('''      <canticum>
+''')
         
         index = 1
         for strophe_sample_list in strophe_sample_lists:
-            xml_content += f'''        <strophe type="strophe" responsion="{responsion_id}">
-'''
+            xml_parts.append(f'''        <strophe type="strophe" responsion="{responsion_id}">
+''')
             
             for line in strophe_sample_list:
                 # Parse the line to extract syllable content and source attribute
@@ -1818,31 +1771,28 @@ def dummy_xml_strophe(strophe_sample_lists_dict, outfile, type="Prose"):
                     source_part = f' source="{source_attr}"' if source_attr else ''
                     
                     # Extract all syllable elements as strings
-                    syll_content = ""
-                    for syll in line_element.xpath(".//syll"):
-                        syll_str = etree.tostring(syll, encoding='unicode', method='xml')
-                        syll_content += syll_str
+                    syll_content = "".join(etree.tostring(syll, encoding='unicode', method='xml') for syll in _syll_all(line_element))
                     
-                    xml_content += f'''          <l n="{index}"{source_part}>{syll_content}</l>
-'''
+                    xml_parts.append(f'''          <l n="{index}"{source_part}>{syll_content}</l>
+''')
                 except etree.XMLSyntaxError:
                     # Fallback for malformed XML - just use the content as-is
-                    xml_content += f'''          <l n="{index}">{line}</l>
-'''
+                    xml_parts.append(f'''          <l n="{index}">{line}</l>
+''')
                 index += 1
 
-            xml_content += '''        </strophe>
-'''
+            xml_parts.append('''        </strophe>
+''')
         
-        xml_content += '''      </canticum>
-'''
+        xml_parts.append('''      </canticum>
+''')
     
-    xml_content += '''    </body>
+    xml_parts.append('''    </body>
   </text>
-</TEI>'''
+</TEI>''')
     
     with open(outfile, 'w', encoding='utf-8') as f:
-        f.write(xml_content)
+        f.write("".join(xml_parts))
 
 ###################
 # SHAPE AUX       #
@@ -16,12 +16,38 @@ the line "xml_content = remove_conjecture_tags(xml_content)" should be commented
 Since extra nested elements are bug prone, <conjecture> elements are otherwise removed.
 
 NB: self-closing placeholder <l skip="True"/> elements are supported, but not recommended. If skipped placeholder lines are needed, use <l skip="True"></l> instead.
+
+Can be run as a script, compiling any number of files in one process:
+
+    python -m responsio_accentuum.compile --pairs in1.xml out1.xml in2.xml out2.xml --workers 4
+
+Without --pairs, all of compile_jobs is compiled.
 '''
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import copy
 from lxml import etree
+import os
 import re
 
-from .stats import canonical_sylls, metrically_responding_lines_polystrophic
+from .stats import canonical_sylls, metrically_responding_canonical
+
+# The (input, output) pairs of the Pindar corpus, one per edition variant
+compile_jobs = [
+    ("data/scan/ht_olympians_triads.xml", "data/compiled/triads/ht_olympians_triads.xml"),
+    ("data/scan/ht_pythians_triads.xml", "data/compiled/triads/ht_pythians_triads.xml"),
+    ("data/scan/ht_nemeans_triads.xml", "data/compiled/triads/ht_nemeans_triads.xml"),
+    ("data/scan/ht_isthmians_triads_FIX_IS04.xml", "data/compiled/triads/ht_isthmians_triads.xml"),
+    ("data/scan/ht_olympians_strophes.xml", "data/compiled/strophes/ht_olympians_strophes.xml"),
+    ("data/scan/ht_pythians_strophes.xml", "data/compiled/strophes/ht_pythians_strophes.xml"),
+    ("data/scan/ht_nemeans_strophes.xml", "data/compiled/strophes/ht_nemeans_strophes.xml"),
+    ("data/scan/ht_isthmians_strophes.xml", "data/compiled/strophes/ht_isthmians_strophes.xml"),
+    ("data/scan/ht_olympians_epodes.xml", "data/compiled/epodes/ht_olympians_epodes.xml"),
+    ("data/scan/ht_pythians_epodes.xml", "data/compiled/epodes/ht_pythians_epodes.xml"),
+    ("data/scan/ht_nemeans_epodes.xml", "data/compiled/epodes/ht_nemeans_epodes.xml"),
+    ("data/scan/ht_isthmians_epodes.xml", "data/compiled/epodes/ht_isthmians_epodes.xml"),
+]
 
 # Mapping of brackets to <syll> tags
 # ***Important: single chars must come after multi-chars!***
@@ -38,29 +64,46 @@ bracket_map = {
     "}": '</syll>'
 }
 
+# Compiled once, instead of on every call
+_regular_skipped_l = re.compile(r"^[ \t]*<l[^>]*\bskip=['\"]True['\"][^>]*>.*?</l>[ \t]*\n?", re.MULTILINE) # \b is a word boundary anchor which matches a position between a word char (\w) and a non-word char (\W).
+_selfclosing_skipped_l = re.compile(r"^[ \t]*<l[^>]*\bskip=['\"]True['\"][^>]*/>[ \t]*\n?", re.MULTILINE) # NB: without the "\n?"" there are empty lines left in the output
+_skip_pattern = re.compile(r"<skip>.*?</skip>", re.DOTALL)
+_conjecture_pattern = re.compile(r'<conjecture[^>]*>(.*?)</conjecture>')
+_selfclosing_conjecture = re.compile(r'<conjecture[^>]*/>')
+_l_pattern = re.compile(r"(<l[^>]*>)(.*?)(</l>)", re.DOTALL)
+_l_opening = re.compile(r'<l([^>]*)>', re.DOTALL)
+_metre_pattern = re.compile(r'metre="([^"]+)"')
+_attribute_pattern = re.compile(r'(\S+?)="(.*?)"')
+_ordered_l_attributes = re.compile(r' n="[^"]+" metre="[^"]*"') # already what order_l_attributes would write
+_canticum_pattern = re.compile(r'\s*<canticum[^>]*>.*?</canticum>\s*', re.DOTALL)
+_empty_l = re.compile(r"<l[^>]*>\s*</l>")
+
 
 def remove_skipped_lines(xml_text):
     """
     Remove <l> elements with skip="True".
     Handles both regular and self-closing <l> tags.
     """
+    # Both patterns need a literal skip=, which a plain substring test finds far faster than the line-anchored regexes
+    if 'skip=' not in xml_text:
+        return xml_text
+
     def clean_line(match):
         line = match.group(0)
         return "" if line.strip() else line
 
-    regular_l = r"^[ \t]*<l[^>]*\bskip=['\"]True['\"][^>]*>.*?</l>[ \t]*\n?" # \b is a word boundary anchor which matches a position between a word char (\w) and a non-word char (\W).
-    selfclose_l = r"^[ \t]*<l[^>]*\bskip=['\"]True['\"][^>]*/>[ \t]*\n?" # NB: without the "\n?"" there are empty lines left in the output
-    
-    text = re.sub(regular_l, clean_line, xml_text, flags=re.MULTILINE) # the flag MULTILINE makes ^ and $ match the start and end of *each* line, instead of of the entire string.
-    text = re.sub(selfclose_l, clean_line, text, flags=re.MULTILINE)
+    # Both patterns are compiled with the flag MULTILINE, which makes ^ and $ match the start and end of *each* line, instead of of the entire string.
+    text = _regular_skipped_l.sub(clean_line, xml_text)
+    text = _selfclosing_skipped_l.sub(clean_line, text)
     
     return text
 
 
 def remove_skipped_parts(xml_text):
     """Remove content inside <skip>...</skip> tags."""
-    skip_pattern = re.compile(r"<skip>.*?</skip>", re.DOTALL)
-    return skip_pattern.sub("", xml_text)
+    if '<skip>' not in xml_text:
+        return xml_text
+    return _skip_pattern.sub("", xml_text)
 
 
 def remove_conjecture_tags(xml_text):
@@ -77,14 +120,16 @@ def remove_conjecture_tags(xml_text):
     # matches = re.findall(r'<conjecture[^>]*>(.*?)</conjecture>', xml_text)
     # print(f"Found {len(matches)} conjecture matches.")
     
-    xml_text = re.sub(r'<conjecture[^>]*>(.*?)</conjecture>', r'\1', xml_text) # r'\1' refers to the group captured by (.*?), the first (1) group in the regex
-    xml_text = re.sub(r'<conjecture[^>]*/>', '', xml_text)
+    if '<conjecture' not in xml_text:
+        return xml_text
+    
+    xml_text = _conjecture_pattern.sub(r'\1', xml_text) # r'\1' refers to the group captured by (.*?), the first (1) group in the regex
+    xml_text = _selfclosing_conjecture.sub('', xml_text)
     return xml_text
 
 
 def compile_scan(xml_text):
     """Compile bracket patterns inside <l> elements into <syll> tags."""
-    l_pattern = re.compile(r"(<l[^>]*>)(.*?)(</l>)", re.DOTALL)
 
     def replace_brackets(match):
         opening, content, closing = match.groups()
@@ -92,49 +137,65 @@ def compile_scan(xml_text):
             content = content.replace(key, value)
         return f"{opening}{content}{closing}"
 
-    return l_pattern.sub(replace_brackets, xml_text)
+    return _l_pattern.sub(replace_brackets, xml_text)
 
 
 def apply_brevis_in_longo(xml_text):
     """Mark the last light non-resolution <syll> of each <l> with brevis_in_longo='True',
     except when metre ends in 'da' (lyric non-stichic dactylic), unless the penultimate syllable is heavy.
     """
-    l_pattern = re.compile(r"(<l[^>]*>)(.*?)(</l>)", re.DOTALL)
+
+    def last_syll_opening(content, end):
+        """Span of the last <syll ...> opening tag in content[:end], found backwards from the end: (start, stop), or None"""
+        while True:
+            start = content.rfind('<syll', 0, end)
+            if start == -1:
+                return None
+            stop = content.find('>', start)
+            if stop != -1:
+                return start, stop + 1
+            end = start
 
     def mark_final_syllable(match):
         opening, content, closing = match.groups()
-        metre_match = re.search(r'metre="([^"]+)"', opening)
-        metre_value = metre_match.group(1) if metre_match else ""
-        syll_matches = list(re.finditer(r'<syll[^>]*>', content))
 
-        if not syll_matches:
-            return f"{opening}{content}{closing}"
+        # Only the last two sylls matter, so they are searched for from the end rather than all matched
+        last_span = last_syll_opening(content, len(content))
 
-        if metre_value.endswith("da"):
-            if len(syll_matches) >= 2:
-                penultimate_syll_match = syll_matches[-2]
-                if 'weight="heavy"' not in penultimate_syll_match.group():
-                    return f"{opening}{content}{closing}"
+        # Most lines are left as they are, and are then returned as matched without being rebuilt
+        if last_span is None:
+            return match.group()
 
-        last_syll_match = syll_matches[-1]
-        last_syll = last_syll_match.group()
+        last_start, last_end = last_span
+        last_syll = content[last_start:last_end]
 
-        if 'weight="light"' in last_syll and 'resolution="True"' not in last_syll:
-            updated_syll = re.sub(r'(>)', r' brevis_in_longo="True"\1', last_syll, count=1)
-            content = content[:last_syll_match.start()] + updated_syll + content[last_syll_match.end():]
+        if 'weight="light"' not in last_syll or 'resolution="True"' in last_syll:
+            return match.group()
 
-        return f"{opening}{content}{closing}"
+        metre_match = _metre_pattern.search(opening)
+        metre_value = metre_match.group(1) if metre_match else ""
+
+        if metre_value.endswith("da"):
+            penultimate_span = last_syll_opening(content, last_start)
+            if penultimate_span is not None:
+                if 'weight="heavy"' not in content[penultimate_span[0]:penultimate_span[1]]:
+                    return match.group()
+
+        # The opening tag ends at its only >, so the attribute is spliced in before it, all in one string
+        return f'{opening}{content[:last_start]}{last_syll[:-1]} brevis_in_longo="True">{content[last_end:]}{closing}'
 
-    return l_pattern.sub(mark_final_syllable, xml_text)
+    return _l_pattern.sub(mark_final_syllable, xml_text)
 
 
 def order_l_attributes(xml_text):
     """Ensure 'n' appears first, 'metre' second, and other attributes follow."""
-    l_pattern = re.compile(r'<l([^>]*)>', re.DOTALL)
 
     def reorder_attributes(match):
         raw_attributes = match.group(1)
-        attrib_dict = dict(re.findall(r'(\S+?)="(.*?)"', raw_attributes))
+        # The common case: just n and metre, in order, so there is nothing to split and rebuild
+        if _ordered_l_attributes.fullmatch(raw_attributes):
+            return match.group()
+        attrib_dict = dict(_attribute_pattern.findall(raw_attributes))
         n = attrib_dict.pop("n", "")
         metre = attrib_dict.pop("metre", "")
         special = {k: v for k, v in attrib_dict.items() if "brevis_in_longo" in k or "resolution" in k}
@@ -146,7 +207,7 @@ def order_l_attributes(xml_text):
             ordered_attribs.append(f'{k}="{v}"')
         return f'<l {" ".join(ordered_attribs)}>'
 
-    return l_pattern.sub(reorder_attributes, xml_text)
+    return _l_opening.sub(reorder_attributes, xml_text)
 
 
 def remove_empty_cantica(xml_text):
@@ -156,14 +217,11 @@ def remove_empty_cantica(xml_text):
 
     NB: Since cantica span multiple lines, we need the regex flag "re.DOTALL".
     """
-    canticum_pattern = re.compile(r'\s*<canticum[^>]*>.*?</canticum>\s*', re.DOTALL)
-    
     def filter_cantica(match):
         cantica = match.group(0)
-        has_sylls = bool(re.search(r'<syll[^>]*>', cantica))
-        return cantica if has_sylls else ''
+        return cantica if '<syll' in cantica else '' # any <syll opens a tag, so no regex is needed
     
-    return canticum_pattern.sub(filter_cantica, xml_text) # function-based replacement is pretty cool
+    return _canticum_pattern.sub(filter_cantica, xml_text) # function-based replacement is pretty cool
 
 
 def validator(text):
@@ -181,25 +239,38 @@ def validator(text):
         elif gt_count > lt_count:
             raise ValueError(f"Lonely > at line {line_number}!")
         # Check for empty <l> elements
-        if re.match(r"<l[^>]*>\s*</l>", line):
+        if _empty_l.match(line):
             raise ValueError(f"Empty <l> element at line {line_number}!")
         
 ################################################################
 ################# Responsion checks and fixes ##################
 ################################################################
 
-def autofix_responsion(xml_text, responsion_id, line_numbers, diff_indices_list, lines):
+def group_strophes_by_responsion(root):
+    """
+    Group the strophes of a parsed tree by their responsion attribute in a single walk.
+    Returns: dict mapping responsion id to its strophes, in document order
+    """
+    responsion_groups = {}
+    for strophe in root.iter('strophe'):
+        responsion_id = strophe.get('responsion')
+        if responsion_id is not None:
+            responsion_groups.setdefault(responsion_id, []).append(strophe)
+    return responsion_groups
+
+def autofix_responsion(root, responsion_id, line_numbers, diff_indices_list, lines):
     """
     Attempt to automatically fix responsion issues by adding anceps="True" attribute
     to syll elements at problematic positions.
+    The fix is made on a copy of the parsed tree, so that root is left as it was if the fix doesn't hold.
     
-    Returns: (success: bool, fixed_xml: str)
+    Returns: (success: bool, fixed_root: the fixed copy, or root itself if no fix was attempted)
     """
     # Check if all strophes have same length
     lengths = [len(canonical_sylls(line)) for line in lines]
     if len(set(lengths)) > 1:
         print(f"Cannot autofix: strophes have different lengths {lengths}")
-        return False, xml_text
+        return False, root
     
     # Find ALL positions that differ in ANY comparison
     # Use union instead of intersection to get all problematic positions
@@ -210,16 +281,16 @@ def autofix_responsion(xml_text, responsion_id, line_numbers, diff_indices_list,
     
     if not all_diffs:
         print(f"Cannot autofix: no problematic positions found")
-        return False, xml_text
+        return False, root
     
     problem_positions = sorted(list(all_diffs))
     print(f"Attempting autofix at {len(problem_positions)} position(s): {[p + 1 for p in problem_positions]} (0-indexed: {problem_positions})")
     
-    # Parse the XML and find the lines by their line numbers
-    root = etree.fromstring(xml_text.encode())
+    # Copy the tree (far cheaper than serializing and reparsing it) and find the lines by their line numbers
+    root = copy.deepcopy(root)
     
     # Get the responsion group strophes
-    group_strophes = [s for s in root.xpath('//strophe[@responsion]') if s.get('responsion') == responsion_id]
+    group_strophes = [s for s in root.iter('strophe') if s.get('responsion') == responsion_id]
     
     updated_sylls = []  # For debugging
     
@@ -269,9 +340,7 @@ def autofix_responsion(xml_text, responsion_id, line_numbers, diff_indices_list,
             print(f"  {syll_info}")
         print()
     
-    # Convert back to string
-    fixed_xml = etree.tostring(root, encoding='unicode')
-    return True, fixed_xml
+    return True, root
 
 def check_line_responsion(lines):
     """
@@ -281,13 +350,14 @@ def check_line_responsion(lines):
     if not lines or len(lines) < 2:
         return True, []
     
-    first_metre = canonical_sylls(lines[0])
-    first_metre = ["u" if syll == "light" else "–" for syll in first_metre]
+    # Derive the canonical syllables once per line; they serve both the diffs and the responsion check
+    canonical_lines = [canonical_sylls(line) for line in lines]
+
+    first_metre = ["u" if syll == "light" else "–" for syll in canonical_lines[0]]
     
     diff_indices_list = []
     for i in range(1, len(lines)):
-        other_metre = canonical_sylls(lines[i])
-        other_metre = ["u" if syll == "light" else "–" for syll in other_metre]
+        other_metre = ["u" if syll == "light" else "–" for syll in canonical_lines[i]]
         
         if len(first_metre) != len(other_metre):
             diff_indices = list(range(max(len(first_metre), len(other_metre))))
@@ -296,7 +366,7 @@ def check_line_responsion(lines):
         
         diff_indices_list.append(diff_indices)
     
-    responds = metrically_responding_lines_polystrophic(*lines)
+    responds = metrically_responding_canonical(*canonical_lines)
     return responds, diff_indices_list
 
 
@@ -306,15 +376,12 @@ def assert_responsion(xml_text, attempt_autofix=True):
     Attempts to autofix simple cases where all strophes have the same length and differ at a single position.
     Returns: (perfect_responsion: bool, xml_text: str)
     """
+    # Parsed once; autofixes swap in a fixed copy of the tree, which is only serialized at the end
     root = etree.fromstring(xml_text.encode())
-    responsion_groups = {}
+    autofixed = False
     
-    # Group strophes by responsion attribute using XPath
-    for strophe in root.xpath('//strophe[@responsion]'):
-        responsion_id = strophe.get('responsion')
-        if responsion_id not in responsion_groups:
-            responsion_groups[responsion_id] = []
-        responsion_groups[responsion_id].append(strophe)
+    # Group strophes by responsion attribute in one pass over the tree
+    responsion_groups = group_strophes_by_responsion(root)
     
     # Global counter for all buggy lines
     total_buggy_lines = 0
@@ -328,10 +395,12 @@ def assert_responsion(xml_text, attempt_autofix=True):
         buggy_lines = 0
         for line_index, lines in enumerate(zip(*strophe_lines)):
             line_numbers = [l.get('n', 'unknown') for l in lines]
+
+            # Derive the canonical syllables once per line; they serve both the diffs and the responsion check
+            canonical_lines = [canonical_sylls(line) for line in lines]
             
             # Process first strophe
-            first_strophe_metre = canonical_sylls(lines[0])
-            first_strophe_metre = ["u" if syll == "light" else "–" for syll in first_strophe_metre]
+            first_strophe_metre = ["u" if syll == "light" else "–" for syll in canonical_lines[0]]
             first_strophe_metre_str = " ".join(first_strophe_metre)
 
             # Process all other strophes
@@ -339,8 +408,7 @@ def assert_responsion(xml_text, attempt_autofix=True):
             diff_indices_list = []
 
             for i in range(1, len(lines)):
-                strophe_metre = canonical_sylls(lines[i])
-                strophe_metre = ["u" if syll == "light" else "–" for syll in strophe_metre]
+                strophe_metre = ["u" if syll == "light" else "–" for syll in canonical_lines[i]]
                 strophe_metre_str = " ".join(strophe_metre)
                 
                 # Calculate differences
@@ -369,7 +437,7 @@ def assert_responsion(xml_text, attempt_autofix=True):
                 })
 
             # Check if lines respond metrically
-            if not metrically_responding_lines_polystrophic(*lines):
+            if not metrically_responding_canonical(*canonical_lines):
                 buggy_lines += 1
                 
                 # Build output string
@@ -387,13 +455,12 @@ def assert_responsion(xml_text, attempt_autofix=True):
                 # Attempt autofix only if enabled
                 if attempt_autofix:
                     print("\nAttempting autofix...")
-                    success, fixed_xml = autofix_responsion(xml_text, responsion_id, line_numbers, diff_indices_list, lines)
+                    success, fixed_root = autofix_responsion(root, responsion_id, line_numbers, diff_indices_list, lines)
                     
                     if success:
                         print("Autofix applied. Rechecking...")
-                        # Get the updated lines from fixed XML
-                        fixed_root = etree.fromstring(fixed_xml.encode())
-                        fixed_strophes = [s for s in fixed_root.xpath('//strophe[@responsion]') if s.get('responsion') == responsion_id]
+                        # Get the updated lines from the fixed tree
+                        fixed_strophes = [s for s in fixed_root.iter('strophe') if s.get('responsion') == responsion_id]
                         fixed_strophe_lines = [strophe.findall('.//l') for strophe in fixed_strophes]
                         fixed_lines = list(zip(*fixed_strophe_lines))[line_index]
                         
@@ -402,11 +469,10 @@ def assert_responsion(xml_text, attempt_autofix=True):
                         
                         if responds:
                             print("\033[32m✓ Autofix successful! Responsion now works.\033[0m\n")
-                            xml_text = fixed_xml  # Update xml_text with the fixed version
-                            # Re-parse to update references for remaining checks
-                            root = etree.fromstring(xml_text.encode())
-                            responsion_groups[responsion_id] = [s for s in root.xpath('//strophe[@responsion]') if s.get('responsion') == responsion_id]
-                            strophe_lines = [strophe.findall('.//l') for strophe in responsion_groups[responsion_id]]
+                            root = fixed_root  # Keep the fixed tree, and update references for remaining checks
+                            autofixed = True
+                            responsion_groups[responsion_id] = fixed_strophes
+                            strophe_lines = fixed_strophe_lines
                             buggy_lines -= 1  # Don't count this as a buggy line since it was fixed
                         else:
                             print("\033[31m✗ Autofix applied but responsion still fails.\033[0m\n")
@@ -423,6 +489,9 @@ def assert_responsion(xml_text, attempt_autofix=True):
         print(f"TOTAL BUGGY LINES ACROSS ALL RESPONSION GROUPS: \033[31m{total_buggy_lines}\033[0m")
         print(f"{'='*60}\n")
     
+    if autofixed:
+        xml_text = etree.tostring(root, encoding='unicode')
+    
     return total_buggy_lines == 0, xml_text
 
 ################################################################
@@ -450,4 +519,48 @@ def process_file(input_file, output_file, make_print=True):
         with open(output_file, "w", encoding="utf-8") as f:
             f.write(xml_content)
         if make_print:
-            print(f"Processed XML saved to {output_file}")
\ No newline at end of file
+            print(f"Processed XML saved to {output_file}")
+
+
+def process_files(jobs=compile_jobs, workers=None, make_print=True):
+    """
+    Process several (input_file, output_file) pairs in one go.
+    Each file is compiled independently, so with workers > 1 they are spread over a process pool,
+    paying the interpreter and import overhead once per worker instead of once per file.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+
+    max_workers = min(workers or os.cpu_count() or 1, len(jobs))
+
+    if max_workers == 1:
+        for input_file, output_file in jobs:
+            process_file(input_file, output_file, make_print=make_print)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process_file, input_file, output_file, make_print) for input_file, output_file in jobs]
+        for future in futures:
+            future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile scanned XML files into <syll>-tagged XML.")
+    parser.add_argument("--pairs", nargs="+", metavar="FILE", help="input and output files, alternating: in1 out1 in2 out2 ... (default: compile_jobs)")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument("--quiet", action="store_true", help="don't print a line per saved file")
+    args = parser.parse_args(argv)
+
+    if args.pairs is None:
+        jobs = compile_jobs
+    elif len(args.pairs) % 2:
+        parser.error("--pairs takes an even number of files: in1 out1 in2 out2 ...")
+    else:
+        jobs = list(zip(args.pairs[::2], args.pairs[1::2]))
+
+    process_files(jobs, workers=args.workers, make_print=not args.quiet)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,17 +11,26 @@ First step of the XML processing pipeline for the accentual responsion project,
 Takes a TEI XML file and extracts manually chosen responding strophes, formatting them as <canticum> elements with <strophe> and <antistrophe> children.
 '''
 
-import re
 from lxml import etree
 
+_ns = {"tei": "http://www.tei-c.org/ns/1.0"}
+
+# Compiled once, instead of per line
+_lines = etree.XPath(".//tei:l", namespaces=_ns)
+
+_tei_div = f"{{{_ns['tei']}}}div"
+_tei_seg = f"{{{_ns['tei']}}}seg"
+
 def transform_tei(input_file, output_file, abbreviation, titletext, authortext):
-    ns = {"tei": "http://www.tei-c.org/ns/1.0"}
 
     def extract_line_text(line):
         """Return the line text excluding seg[@rend='Marginalia'],
         turning <space/> into a literal space, ignoring <pb/> but
-        always keeping element tails. Cleans ⸐ and collapses whitespace."""
+        always keeping element tails. Cleans ⸐ and collapses whitespace.
+        Also returns whether the line holds a tei:seg[@rend='Marginalia'],
+        which is noted during the same walk: (text, has_marginalia)."""
         parts = []
+        has_marginalia = False
 
         # Text before the first child
         if line.text:
@@ -31,9 +40,12 @@ def transform_tei(input_file, output_file, abbreviation, titletext, authortext):
             if node is line:
                 continue
 
-            tag = etree.QName(node).localname if isinstance(node.tag, str) else None
+            # Local name without building a QName per node (comments and PIs have no str tag)
+            tag = node.tag.rpartition("}")[2] if isinstance(node.tag, str) else None
 
             if tag == "seg" and node.get("rend") == "Marginalia":
+                if node.tag == _tei_seg:
+                    has_marginalia = True
                 if node.tail:
                     parts.append(node.tail)
                 continue
@@ -55,38 +67,23 @@ def transform_tei(input_file, output_file, abbreviation, titletext, authortext):
                 parts.append(node.tail)
 
         text = "".join(parts)
-        # remove ⸐ chars
+        # remove ⸐ chars (str.replace returns the line itself when there are none,
+        # far cheaper than a str.translate table)
         text = text.replace("⸐", "")
-        # normalize whitespace
-        text = re.sub(r"\s+", " ", text).strip()
-        return text
-
-    # Parse input
-    tree = etree.parse(input_file)
-    root = tree.getroot()
-
-    # Build new TEI root
-    new_root = etree.Element("TEI")
-    new_header = etree.SubElement(new_root, "teiHeader")
-    fileDesc = etree.SubElement(new_header, "fileDesc")
-    titleStmt = etree.SubElement(fileDesc, "titleStmt")
-    title = etree.SubElement(titleStmt, "title")
-    title.text = titletext
-    author = etree.SubElement(titleStmt, "author")
-    author.text = authortext
-
-    new_text = etree.SubElement(new_root, "text")
-    new_body = etree.SubElement(new_text, "body")
+        # normalize whitespace (split() without arguments splits on the same whitespace as \s+ and drops the ends)
+        text = " ".join(text.split())
+        return text, has_marginalia
 
-    # All odes -> one canticum each
-    odes = root.xpath("//tei:div[@type='Ode']", namespaces=ns)
-    for canticum_index, ode in enumerate(odes, start=1):
-        canticum = etree.SubElement(new_body, "canticum")
+    def build_canticum(ode, canticum_index):
+        """One canticum from an ode; strophes start at the lines holding marginalia"""
+        canticum = etree.Element("canticum")
         responsion_id = f"{abbreviation}{canticum_index:02d}"
 
+        # One walk per line gives both its text and whether it starts a new strophe
+        lines = [(line, *extract_line_text(line)) for line in _lines(ode)]
+
         strophe = None
-        for line in ode.xpath(".//tei:l", namespaces=ns):
-            has_marginalia = line.xpath(".//tei:seg[@rend='Marginalia']", namespaces=ns)
+        for line, text, has_marginalia in lines:
             if has_marginalia:
                 strophe = etree.SubElement(
                     canticum,
@@ -97,16 +94,16 @@ def transform_tei(input_file, output_file, abbreviation, titletext, authortext):
 
             if strophe is not None:
                 l = etree.SubElement(strophe, "l", n=line.get("n"), metre="")
-                l.text = extract_line_text(line)
+                l.text = text
 
         # If no marginalia at all
         if not canticum.findall("strophe"):
             strophe = etree.SubElement(
                 canticum, "strophe", type="strophe", responsion=responsion_id
             )
-            for line in ode.xpath(".//tei:l", namespaces=ns):
+            for line, text, _ in lines:
                 l = etree.SubElement(strophe, "l", n=line.get("n"), metre="")
-                l.text = extract_line_text(line)
+                l.text = text
 
         # --- Sanity check ---
         lengths = [len(s.findall("l")) for s in canticum.findall("strophe")]
@@ -115,6 +112,35 @@ def transform_tei(input_file, output_file, abbreviation, titletext, authortext):
                 f"[WARNING] Canticum {canticum_index} has inconsistent strophe lengths: {lengths}"
             )
 
+        return canticum
+
+    def iter_odes():
+        """Stream the ode divs of the input, freeing each (and everything before it) once used"""
+        for _, ode in etree.iterparse(input_file, events=("end",), tag=_tei_div):
+            if ode.get("type") != "Ode":
+                continue
+            yield ode
+            ode.clear()
+            while ode.getprevious() is not None:
+                del ode.getparent()[0]
+
+    # Build new TEI root
+    new_root = etree.Element("TEI")
+    new_header = etree.SubElement(new_root, "teiHeader")
+    fileDesc = etree.SubElement(new_header, "fileDesc")
+    titleStmt = etree.SubElement(fileDesc, "titleStmt")
+    title = etree.SubElement(titleStmt, "title")
+    title.text = titletext
+    author = etree.SubElement(titleStmt, "author")
+    author.text = authortext
+
+    new_text = etree.SubElement(new_root, "text")
+    new_body = etree.SubElement(new_text, "body")
+
+    # All odes -> one canticum each; only the input is streamed, the output is just the extracted lines
+    for canticum_index, ode in enumerate(iter_odes(), start=1):
+        new_body.append(build_canticum(ode, canticum_index))
+
     # Write output
     out_tree = etree.ElementTree(new_root)
     out_tree.write(
@@ -123,7 +149,3 @@ def transform_tei(input_file, output_file, abbreviation, titletext, authortext):
         encoding="UTF-8",
         pretty_print=True
     )
-
-
-
-
@@ -23,12 +23,19 @@ from grc_utils import syllabifier, vowel
 
 from .scan import muta, liquida, to_clean, heavy_syll
 
+# Compiled once, instead of per line; splits a scanned line into its bracketed sylls
+_syll_pattern = re.compile(r'(\[.+?\]|\{.+?\})')
+
+def _strip_brackets(text):
+    """Remove all [] and {} from a scanned line (plain replaces are faster than a regex or str.translate here)"""
+    return text.replace('[', '').replace(']', '').replace('{', '').replace('}', '')
+
 def fix_scansion(text):
     '''
     Assumes the first strophe in each responsion group is correct,
     and changes the weight of all dichronic syllables in other strophes to match it.
     '''
-    sylls = re.split(r'(\[.+?\]|\{.+?\})', text)
+    sylls = _syll_pattern.split(text)
 
     # iterate through sylls and next_sylls: if syll 1) does not contain U+02C8 (ˈ), MODIFIER LETTER VERTICAL LINE, and 2) syll[-1] in muta and 3) next_syll[1] in liquida too, then move syll[-1] to the beginning of next_syll.
     for idx, syll in enumerate(sylls):
@@ -37,27 +44,27 @@ def fix_scansion(text):
             sylls[idx] = syll[:-1]
             sylls[idx + 1] = syll[-1] + next_syll
 
-    line = ""
+    line = []
 
     for idx, syll in enumerate(sylls):
 
-        syll_clean = re.sub(to_clean, "", syll.strip())
+        syll_clean = to_clean.sub("", syll.strip())
         next_syll = sylls[idx + 1] if idx + 1 < len(sylls) else ""
 
         # preempt vowel hiatus and correption
         if vowel(syll[-1]) and next_syll.startswith(" ") and vowel(next_syll[1]):
-            line = line + "{" + f"{syll}" + "}"
+            line.append(f"{{{syll}}}")
 
-        elif any("_" in char for char in syll):
-            line = line + "[" + f"{syll}" + "]"
+        elif "_" in syll:
+            line.append(f"[{syll}]")
         elif syll_clean[-1] == "^":
-            line = line + "{" + f"{syll}" + "}"
+            line.append(f"{{{syll}}}")
         elif heavy_syll(syll):
-            line = line + "[" + f"{syll}" + "]"
+            line.append(f"[{syll}]")
         else:
-            line = line + "{" + f"{syll}" + "}"
+            line.append(f"{{{syll}}}")
 
-    return line
+    return "".join(line)
 
 def fix_xml(input_file, output_file, debug=False):
 
@@ -102,7 +109,7 @@ def fix_xml(input_file, output_file, debug=False):
         text = l.xpath("string()").strip()
         if debug:
             print(f"Line {idx+1}: {text}")
-        sylls = re.split(r'(\[.+?\]|\{.+?\})', text)
+        sylls = _syll_pattern.split(text)
         sylls = [syll for syll in sylls if syll]  # Remove empty matches
         for syll in sylls:
             if "[" in syll:
@@ -130,7 +137,7 @@ def fix_xml(input_file, output_file, debug=False):
             # Get the raw text content without any markup
             text = l.xpath("string()").strip()
             # Remove brackets and braces to get clean text
-            clean_text = re.sub(r'[\[\]\{\}]', '', text)
+            clean_text = _strip_brackets(text)
             
             # Syllabify the clean text
             syllables = syllabifier(clean_text)
@@ -160,12 +167,11 @@ def fix_xml(input_file, output_file, debug=False):
             text = l.xpath("string()").strip()
             if debug:
                 print(f"Line {idx+1}: {text}")
-            sylls = re.split(r'(\[.+?\]|\{.+?\})', text)
+            sylls = _syll_pattern.split(text)
             sylls = [syll for syll in sylls if syll]  # Remove empty matches
             assert len(gold_strophe[idx]) == len(sylls), f"Line {text} with len {len(sylls)} in strophe does not match gold length {len(gold_strophe[idx])} of {gold_strophe[idx]}."
             new_line = ""
             for syll, weight in zip(sylls, gold_strophe[idx]):
-                new_syll = re.sub(r'[\[\]\{\}]', '', syll)  # Remove existing brackets
                 if weight == "-":
                     new_line += "[" + f"{syll}" + "]"
                 else:
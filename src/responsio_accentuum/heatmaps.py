@@ -5,32 +5,92 @@
 # This file is part of responsio-accentuum, licensed under the GNU General Public License v3.0.
 # See the LICENSE file in the project root for full details.
 
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from fractions import Fraction
+from functools import lru_cache
+import hashlib
+from itertools import zip_longest
 from lxml import etree
+from matplotlib import font_manager
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+from PIL import Image, ImageDraw, ImageFont # Pillow ships with matplotlib
 import seaborn as sns
 
-from .stats_comp import compatibility_canticum, compatibility_play
-from .utils.utils import get_text_matrix
+from .stats_comp import compatibility_canticum_array, compatibility_play
+from .utils.utils import get_text_matrix, parse_xml_root
+
+# One parser for all files. No xml:id table is needed, and huge_tree lifts libxml2's limits for the big compiled files.
+# NB not remove_blank_text, since the whitespace-only tails between sylls are the word ends
+_parser = etree.XMLParser(collect_ids=False, huge_tree=True)
+
+# Precompiled, since they are evaluated once per canticum
+_cantica = etree.XPath(".//canticum")
+_strophes_by_responsion = etree.XPath(".//strophe[@responsion=$rid]")
+_strophes_and_antistrophes_by_responsion = etree.XPath(".//*[self::strophe or self::antistrophe][@responsion=$rid]")
+
+# Results for files on disk, keyed by (content digest, canticum id[, representative strophe]),
+# so that replotting an unchanged file in the same session neither reparses nor rescores it.
+# As in stats_comp.compatibility_canticum, the digest rather than the path and mtime keeps an edited
+# or rewritten file from hitting stale entries, which simply age out of the bounded LRUs.
+_TILE_CACHE_SIZE = 256
+_array_cache = OrderedDict() # -> (padded_data, row_lengths) from compatibility_canticum_array, frozen
+_text_cache = OrderedDict() # -> (text_matrix, row_lengths) from get_text_matrix
+
+def _file_key(xml_file):
+    '''Content digest of xml_file, or None for an already parsed tree, which is not cached.'''
+    if isinstance(xml_file, (etree._Element, etree._ElementTree)):
+        return None
+    with open(xml_file, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+def _cache_get(cache, file_key, *key):
+    '''The entry of cache for file_key and key, or None if there is none.'''
+    if file_key is None:
+        return None
+    entry = cache.get((file_key, *key))
+    if entry is not None:
+        cache.move_to_end((file_key, *key))
+    return entry
+
+def _cache_put(cache, file_key, key, value):
+    cache[(file_key, *key)] = value
+    cache.move_to_end((file_key, *key))
+    if len(cache) > _TILE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def _store_array(file_key, canticum_id, array_data):
+    if file_key is not None:
+        for arr in array_data:
+            arr.setflags(write=False)
+        _cache_put(_array_cache, file_key, (canticum_id,), array_data)
+    return array_data
+
+def _store_text(file_key, canticum_id, representative_strophe, text_data):
+    if file_key is not None:
+        _cache_put(_text_cache, file_key, (canticum_id, representative_strophe), text_data)
+    return text_data
 
 def canticum_with_at_least_two_strophes(xml_file, responsion_attribute: str):
-    tree = etree.parse(xml_file)
-    root = tree.getroot()
+    '''
+    xml_file: path to the XML file, or its already parsed root
+    '''
+    root = parse_xml_root(xml_file, parser=_parser)
 
-    strophes = root.findall(f".//strophe[@responsion='{responsion_attribute}']")
+    strophes = _strophes_by_responsion(root, rid=responsion_attribute)
 
     return len(strophes) >= 2
 
 def canticum_number_of_strophes(xml_file, responsion_attribute: str):
     '''
+    xml_file: path to the XML file, or its already parsed root
     responsion_attribute: e.g. 'ol01', 'py05', etc.
     '''
-    tree = etree.parse(xml_file)
-    root = tree.getroot()
+    root = parse_xml_root(xml_file, parser=_parser)
 
-    strophes = root.findall(f".//*[self::strophe or self::antistrophe][@responsion='{responsion_attribute}']")
+    strophes = _strophes_and_antistrophes_by_responsion(root, rid=responsion_attribute)
 
     return len(strophes)
 
@@ -51,12 +111,123 @@ def canticum_number_of_strophes(xml_file, responsion_attribute: str):
 
 #     return len(strophes)
 
-def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str):
+def _pad_rows(data_matrix):
+    '''
+    Stack the ragged rows of data_matrix into one 2D float32 array, padded with NaN on the right.
+    zip_longest does the padding column by column, so there is no per-row slice assignment;
+    float32 is plenty for a colormap and halves what seaborn has to push through it.
+    '''
+    return np.array(list(zip_longest(*data_matrix, fillvalue=np.nan)), dtype=np.float32).T
+
+def _tile_mesh(ax, padded_data):
+    '''
+    The heatmap of one tile of make_all_heatmaps: what sns.heatmap draws there, as a single pcolormesh.
+    sns.heatmap also draws the whole figure on every call (to check its tick labels for overlap),
+    so with one call per tile the cost grew with the square of the number of cantica.
+    The NaN padding is masked, and so left undrawn, just as with mask=np.isnan(padded_data).
+    '''
+    n_rows, n_cols = padded_data.shape
+    ax.pcolormesh(np.ma.masked_invalid(padded_data), cmap="viridis", rasterized=True) # one image rather than a path per cell in PDF/SVG
+    ax.set(xlim=(0, n_cols), ylim=(n_rows, 0), xticks=[], yticks=[])
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+def _fraction_ticks(min_val, max_den=12, max_ticks=10):
+    '''
+    Colorbar ticks a/b, (a+1)/b, ..., b/b, where a/b approximates min_val.
+    The denominator is capped at max_den, since an awkward float would otherwise give a denominator
+    in the thousands and as many ticks; if there are still more than max_ticks, they are evenly subsampled.
+
+    Returns (tick_positions, tick_labels).
+    '''
+    min_frac = Fraction(float(min_val)).limit_denominator(max_den)
+
+    # denominator b
+    den = min_frac.denominator
+    start = min_frac.numerator
+
+    # Generate fractions from a/b to b/b
+    fractions = [Fraction(n, den) for n in range(start, den + 1)]
+    if len(fractions) > max_ticks:
+        keep = sorted(set(np.linspace(0, len(fractions) - 1, max_ticks).round().astype(int)))
+        fractions = [fractions[i] for i in keep]
+
+    tick_positions = [float(fr) for fr in fractions]
+    tick_labels = [str(fr) for fr in fractions]
+    return tick_positions, tick_labels
+
+@lru_cache(maxsize=None)
+def _overlay_font(size_px: int):
+    '''The default matplotlib font (DejaVu Sans, which covers Greek), loaded once per pixel size.'''
+    return ImageFont.truetype(font_manager.findfont(font_manager.FontProperties()), size_px)
+
+def _text_overlay_image(text_matrix, n_rows, n_cols, cell_w, cell_h, font_px):
+    '''
+    Render the syllables of text_matrix into one transparent RGBA image, one cell per heatmap cell,
+    so that a tile carries a single image instead of one Text artist per syllable.
+    cell_w, cell_h and font_px are in output pixels.
+    '''
+    width = max(1, round(n_cols * cell_w))
+    height = max(1, round(n_rows * cell_h))
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    font = _overlay_font(font_px)
+
+    for i, row in enumerate(text_matrix):
+        for j, val in enumerate(row):
+            draw.text(((j + 0.5) * cell_w, (i + 0.5) * cell_h), val, font=font, fill="white", anchor="mm")
+
+    return np.asarray(image)
+
+def _draw_text_overlay(ax, text_matrix, n_rows, n_cols, fontsize, dpi):
+    '''
+    Put the syllables of text_matrix on top of the heatmap in ax as a single image artist,
+    rendered at the resolution the figure will be saved with.
+    Call this once the layout is final, since the image is sized to the current extent of ax.
+    '''
+    bbox = ax.get_window_extent()
+    scale = dpi / ax.figure.dpi
+    font_px = max(1, round(fontsize * dpi / 72)) # fontsize in points
+    overlay = _text_overlay_image(text_matrix, n_rows, n_cols, bbox.width * scale / n_cols, bbox.height * scale / n_rows, font_px)
+    ax.imshow(overlay, extent=(0, n_cols, n_rows, 0), interpolation="nearest", aspect="auto", zorder=3)
+
+def _canticum_xml(root, canticum_id):
+    '''The strophes of one canticum serialized on their own, for shipping to a worker process.'''
+    strophes = _strophes_by_responsion(root, rid=canticum_id)
+    return b"<canticum>" + b"".join(etree.tostring(strophe) for strophe in strophes) + b"</canticum>"
+
+def _canticum_tile_data(xml_source, canticum_id):
+    '''
+    Text and compatibility matrices for one tile of make_all_heatmaps.
+    xml_source is either the parsed root or the output of _canticum_xml,
+    so that a worker process needn't reparse the whole file.
+    '''
+    root = etree.fromstring(xml_source, _parser) if isinstance(xml_source, bytes) else xml_source
+    text_data = get_text_matrix(root, responsion_attribute=canticum_id, representative_strophe=1)
+    array_data = compatibility_canticum_array(root, canticum_ID=canticum_id)
+    return text_data, array_data
+
+# Below this width in output pixels a tile cell cannot hold a legible syllable, so its text is not drawn
+_MIN_CELL_PX = 8
+
+def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str, workers: int = 1, dpi: int = 200):
+    '''
+    workers: with workers > 1, the compatibility data of the cantica is computed in a process pool;
+    the plotting itself always happens in the main process.
+    dpi: resolution of the saved figure. 200 is plenty, since every cell is well under an inch even at figsize (20, 4 * rows).
+    '''
+    file_key = _file_key(xml_file)
+
     # First, count actual cantica in the file
-    tree = etree.parse(xml_file)
+    # NB the file is parsed only once; the root is passed on to all helpers below
+    tree = etree.parse(xml_file, _parser)
     root = tree.getroot()
-    canticums = root.findall(".//canticum")
+    canticums = _cantica(root)
     num_canticums = len(canticums)
+
+    # Strophe counts for all cantica in a single walk, rather than one tree scan per canticum and helper
+    strophe_counts = Counter(strophe.get("responsion") for strophe in root.iter("strophe"))
+    strophe_and_antistrophe_counts = Counter(el.get("responsion") for el in root.iter("strophe", "antistrophe"))
     
     # Calculate grid dimensions
     cols = 5
@@ -71,6 +242,25 @@ def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str):
     for idx in range(num_canticums, rows * cols):
         axes[idx].set_visible(False)
 
+    overlays = [] # (ax, text_matrix, n_rows, n_cols), drawn once the layout is final
+
+    # The cantica are independent, so their data can be computed in parallel up front
+    # Tiles of an unchanged file that were already computed in this session are taken from the cache
+    def cached_tile(canticum_id):
+        text_data = _cache_get(_text_cache, file_key, canticum_id, 1)
+        array_data = _cache_get(_array_cache, file_key, canticum_id)
+        if text_data is None or array_data is None:
+            return None
+        return text_data, array_data
+
+    futures = None
+    if workers > 1:
+        renderable = [f"{prefix}{idx+1:02d}" for idx in range(num_canticums)]
+        renderable = [canticum_id for canticum_id in renderable if strophe_counts[canticum_id] >= 2 and cached_tile(canticum_id) is None]
+        if renderable:
+            with ProcessPoolExecutor(max_workers=min(workers, len(renderable))) as executor:
+                futures = {canticum_id: executor.submit(_canticum_tile_data, _canticum_xml(root, canticum_id), canticum_id) for canticum_id in renderable}
+
     for idx in range(num_canticums):
         canticum_id = f"{prefix}{idx+1:02d}"
         canticum_idx = idx + 1
@@ -80,10 +270,10 @@ def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str):
         ax.set_facecolor("black")
         
         # Get number of strophes for the title
-        num_strophes = canticum_number_of_strophes(xml_file, canticum_id)
+        num_strophes = strophe_and_antistrophe_counts[canticum_id]
         title_text = f"{canticum_id} ({num_strophes})"
         
-        if not canticum_with_at_least_two_strophes(xml_file, canticum_id):
+        if strophe_counts[canticum_id] < 2:
             # Style the skipped canticum with dark background and message
             ax.text(0.5, 0.5, f"Skipped: {canticum_id}\n(< 2 strophes)", 
                     ha='center', va='center', transform=ax.transAxes, 
@@ -94,26 +284,19 @@ def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str):
             continue
         
         try:
-            # Get text matrix
-            text_matrix, row_lengths = get_text_matrix(xml_file, responsion_attribute=canticum_id, representative_strophe=1)
-            
-            # Get compatibility data
-            data_matrix = compatibility_canticum(xml_file, canticum_ID=canticum_id)
-            
-            # Pad numeric matrix for heatmap
-            max_len = max(len(row) for row in data_matrix)
-            padded_data = np.full((len(data_matrix), max_len), np.nan)
-            for i, row in enumerate(data_matrix):
-                padded_data[i, :len(row)] = row
+            # Get text matrix and compatibility data
+            # NB the numeric matrix comes already padded for the heatmap
+            tile = cached_tile(canticum_id)
+            if tile is None:
+                if futures is not None:
+                    text_data, array_data = futures[canticum_id].result()
+                else:
+                    text_data, array_data = _canticum_tile_data(root, canticum_id)
+                tile = _store_text(file_key, canticum_id, 1, text_data), _store_array(file_key, canticum_id, array_data)
+            (text_matrix, _), (padded_data, _) = tile
             
-            # Create heatmap
-            sns.heatmap(
-                padded_data,
-                cmap="viridis",
-                mask=np.isnan(padded_data),
-                cbar=False,  # Disable individual colorbars
-                ax=ax
-            )
+            # Create heatmap (no individual colorbars)
+            _tile_mesh(ax, padded_data)
             
             # Dark styling
             ax.tick_params(colors="white", labelsize=8)
@@ -121,15 +304,8 @@ def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str):
             ax.set_ylabel("")
             ax.set_title(title_text, color="white", fontsize=12)
             
-            # Overlay text (smaller font for subplots)
-            for i, row in enumerate(text_matrix):
-                for j, val in enumerate(row):
-                    ax.text(
-                        j + 0.5, i + 0.5,
-                        val,
-                        ha='center', va='center',
-                        color='white', fontsize=6
-                    )
+            # Overlay text (smaller font for subplots), rasterized below
+            overlays.append((ax, text_matrix, *padded_data.shape))
             
             # Remove tick labels for cleaner look
             ax.set_xticks([])
@@ -147,19 +323,41 @@ def make_all_heatmaps(xml_file: str, prefix: str, suptitle: str):
     plt.suptitle(suptitle, 
                 color="white", fontsize=16, y=0.98)
     plt.tight_layout()
-    plt.savefig(f"media/heatmaps/triads/tiled/{prefix}_all_heatmaps.png", dpi=600, bbox_inches="tight")
+
+    # Each tile gets its syllables as one pre-rendered image, sized to the tile's final extent at the output dpi,
+    # unless its cells are too narrow for the text to be legible anyway
+    for ax, text_matrix, n_rows, n_cols in overlays:
+        px_per_cell = ax.get_window_extent().width * dpi / fig.dpi / n_cols
+        if px_per_cell < _MIN_CELL_PX:
+            continue
+        _draw_text_overlay(ax, text_matrix, n_rows, n_cols, fontsize=6, dpi=dpi)
+
+    plt.savefig(f"media/heatmaps/triads/tiled/{prefix}_all_heatmaps.png", dpi=dpi, bbox_inches="tight")
     plt.show()
 
-def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str, title: str, representative_strophe: int, save: bool = False, show: bool = True, dark_mode: bool = False, text_overlay: bool = False):
+def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str, title: str, representative_strophe: int, save: bool = False, show: bool = True, dark_mode: bool = False, text_overlay: bool = False, max_den: int = 12, dpi: int | None = None):
+    '''
+    dpi: resolution of the saved figure. Defaults to 600 with text_overlay, where the syllables need it,
+    and to 200 without, where the only raster content is a small viridis grid and PNG encoding of 600 dpi dominates.
+    '''
+    if dpi is None:
+        dpi = 600 if text_overlay else 200
 
     # -----------------------------
     # Compute compatibility data
     # -----------------------------
 
-    data_matrix = compatibility_canticum(xml_file, responsion_attribute)
-    row_lengths_data = [len(row) for row in data_matrix]
-    num_rows_data = len(data_matrix)
-    max_len_data = max(len(row) for row in data_matrix)
+    # Unchanged files are served from the cache; otherwise parse once for both the data and the text matrix
+    file_key = _file_key(xml_file)
+    root = None
+
+    # NB already padded with NaN for the heatmap
+    array_data = _cache_get(_array_cache, file_key, responsion_attribute)
+    if array_data is None:
+        root = parse_xml_root(xml_file, parser=_parser)
+        array_data = _store_array(file_key, responsion_attribute, compatibility_canticum_array(root, responsion_attribute))
+    padded_data, row_lengths_data = array_data
+    num_rows_data, max_len_data = padded_data.shape
 
     if text_overlay:
         
@@ -167,12 +365,17 @@ def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str,
         # Prepare text matrix
         # -----------------------------
 
-        text_matrix, row_lengths = get_text_matrix(xml_file, responsion_attribute, representative_strophe)
+        text_data = _cache_get(_text_cache, file_key, responsion_attribute, representative_strophe)
+        if text_data is None:
+            if root is None:
+                root = parse_xml_root(xml_file, parser=_parser)
+            text_data = _store_text(file_key, responsion_attribute, representative_strophe, get_text_matrix(root, responsion_attribute, representative_strophe))
+        text_matrix, row_lengths = text_data
         num_rows_text = len(text_matrix)
         
         print(f"Number of rows: {num_rows_text}")
         print(f"Length of each row (text matrix): {row_lengths}")
-        print("Length of each row (data matrix):", row_lengths_data)
+        print("Length of each row (data matrix):", row_lengths_data.tolist())
 
         # -----------------------------
         # Shape check
@@ -181,32 +384,15 @@ def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str,
         if num_rows_text != num_rows_data:
             raise ValueError(f"Number of rows mismatch: text_matrix={num_rows_text}, data_matrix={num_rows_data}")
 
-        max_len_text = max(len(row) for row in text_matrix)
+        max_len_text = max(row_lengths, default=0) # get_text_matrix already measured the rows
 
         if max_len_text != max_len_data:
             raise ValueError(f"Max row length mismatch: max text length={max_len_text}, max data length={max_len_data}")
 
-    # -----------------------------
-    # Pad numeric matrix for heatmap
-    # -----------------------------
-
     max_len = max_len_data
-    padded_data = np.full((len(data_matrix), max_len), np.nan)
-    for i, row in enumerate(data_matrix):
-        padded_data[i, :len(row)] = row
-
 
     min_val = np.nanmin(padded_data)
-    min_frac = Fraction(min_val).limit_denominator()  # exact rational
-
-    # denominator b
-    den = min_frac.denominator
-    start = min_frac.numerator
-
-    # Generate fractions from a/b to b/b
-    fractions = [Fraction(n, den) for n in range(start, den + 1)]
-    tick_positions = [float(fr) for fr in fractions]
-    tick_labels = [str(fr) for fr in fractions]
+    tick_positions, tick_labels = _fraction_ticks(min_val, max_den=max_den)
 
     # -----------------------------
     # Plot heatmap
@@ -224,17 +410,6 @@ def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str,
     colorbar = ax.collections[0].colorbar
     colorbar.set_ticklabels(tick_labels)
 
-    # Overlay text
-    if text_overlay:
-        for i, row in enumerate(text_matrix):
-            for j, val in enumerate(row):
-                ax.text(
-                    j + 0.5, i + 0.5,
-                    val,
-                    ha='center', va='center',
-                    color='white', fontsize=10
-                )
-
     plt.title(title)
 
     plt.xlabel("Metrical position (resolutions merged)")
@@ -244,8 +419,8 @@ def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str,
     )
     plt.ylabel("Line")
     plt.yticks(
-        ticks=np.arange(len(data_matrix)) + 0.5,
-        labels=np.arange(1, len(data_matrix) + 1)
+        ticks=np.arange(num_rows_data) + 0.5,
+        labels=np.arange(1, num_rows_data + 1)
     )
 
     # Optional dark background + white labels
@@ -259,15 +434,22 @@ def make_one_heatmap(xml_file: str, out_folder: str, responsion_attribute: str,
         # Fix colorbar text color for dark mode
         colorbar.ax.tick_params(colors="white")
 
+    # Overlay text, as one image rather than one Text artist per cell; the axes are laid out by now
+    if text_overlay:
+        _draw_text_overlay(ax, text_matrix, num_rows_data, max_len_data, fontsize=10, dpi=dpi)
+
     out_filename = f"{responsion_attribute}.png"
     out_path = os.path.join(out_folder, out_filename)
 
     if save:
-        plt.savefig(out_path, dpi=600, bbox_inches="tight")
+        plt.savefig(out_path, dpi=dpi, bbox_inches="tight")
     if show:
         plt.show()
 
-def make_one_heatmap_per_100_baselines(xml_file: str, out_folder: str, responsion_attribute: str, title: str, save: bool, show: bool = True, dark_mode: bool = False):
+def make_one_heatmap_per_100_baselines(xml_file: str, out_folder: str, responsion_attribute: str, title: str, save: bool, show: bool = True, dark_mode: bool = False, max_den: int = 12, dpi: int = 200):
+    '''
+    dpi: resolution of the saved figure; there is no text overlay here, so 200 is plenty.
+    '''
 
     # -----------------------------
     # Compute compatibility data
@@ -283,34 +465,22 @@ def make_one_heatmap_per_100_baselines(xml_file: str, out_folder: str, responsio
             line.append(mean_position)
         data_matrix.append(line)
     
-    for line in data_matrix:
-        print(len(line))
+    print(*map(len, data_matrix), sep="\n")
     
     if len(data_matrix) == 1:
         data_matrix = data_matrix[0]
-    max_len_data = max(len(row) for row in data_matrix)
 
     # -----------------------------
     # Pad numeric matrix for heatmap
     # -----------------------------
 
-    max_len = max_len_data
-    padded_data = np.full((len(data_matrix), max_len), np.nan)
-    for i, row in enumerate(data_matrix):
-        padded_data[i, :len(row)] = row
+    # NB the padded shape gives the longest row, so the rows needn't be measured separately
+    padded_data = _pad_rows(data_matrix)
+    num_rows, max_len = padded_data.shape
 
 
     min_val = np.nanmin(padded_data)
-    min_frac = Fraction(min_val).limit_denominator()  # exact rational
-
-    # denominator b
-    den = min_frac.denominator
-    start = min_frac.numerator
-
-    # Generate fractions from a/b to b/b
-    fractions = [Fraction(n, den) for n in range(start, den + 1)]
-    tick_positions = [float(fr) for fr in fractions]
-    tick_labels = [str(fr) for fr in fractions]
+    tick_positions, tick_labels = _fraction_ticks(min_val, max_den=max_den)
 
     # -----------------------------
     # Plot heatmap
@@ -337,8 +507,8 @@ def make_one_heatmap_per_100_baselines(xml_file: str, out_folder: str, responsio
     )
     plt.ylabel("Line")
     plt.yticks(
-        ticks=np.arange(len(data_matrix)) + 0.5,
-        labels=np.arange(1, len(data_matrix) + 1)
+        ticks=np.arange(num_rows) + 0.5,
+        labels=np.arange(1, num_rows + 1)
     )
 
     # Optional dark background + white labels
@@ -356,6 +526,6 @@ def make_one_heatmap_per_100_baselines(xml_file: str, out_folder: str, responsio
     out_path = os.path.join(out_folder, out_filename)
 
     if save:
-        plt.savefig(out_path, dpi=600, bbox_inches="tight")
+        plt.savefig(out_path, dpi=dpi, bbox_inches="tight")
     if show:
         plt.show()
\ No newline at end of file
@@ -5,6 +5,7 @@
 # This file is part of responsio-accentuum, licensed under the GNU General Public License v3.0.
 # See the LICENSE file in the project root for full details.
 
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
 import os
 import re
@@ -15,21 +16,25 @@ from grc_utils import count_ambiguous_dichrona_in_open_syllables, is_diphthong,
 muta = r'βγδθκπτφχΒΓΔΘΚΠΤΦΧ' # stops
 liquida = r'[λΛμΜνΝρῤῥῬ]' # liquids and nasals
 
-to_clean = r'[\u0387\u037e\u00b7\.,!?;:\"()\[\]{}<>«»\-—…|⏑⏓†×]'
+to_clean = re.compile(r'[\u0387\u037e\u00b7\.,!?;:\"()\[\]{}<>«»\-—…|⏑⏓†×]')
 
 def heavy_syll(syll):
     """Check if a syllable is heavy (either ends on a consonant or contains a long vowel/diphthong)."""
 
-    cleaned = re.sub(to_clean, "", syll.strip())
+    cleaned = to_clean.sub("", syll.strip())
 
+    # Cheapest test first: most heavy sylls are closed, and then the vowel tests need not run at all
     closed = not vowel(cleaned[-1])
+    if closed:
+        return True
 
-    substrings = [cleaned[i:i+2] for i in range(len(cleaned) - 1)]
-    has_diphthong = any(is_diphthong(substring) for substring in substrings)
+    has_diphthong = any(is_diphthong(cleaned[i:i+2]) for i in range(len(cleaned) - 1))
+    if has_diphthong:
+        return True
 
     has_long = not short_vowel(syll) and count_ambiguous_dichrona_in_open_syllables(syll) == 0 # short_vowel does not include short dichrona
     
-    return closed or has_diphthong or has_long
+    return has_long
 
 def rule_scansion(input, correption=True):
     '''
@@ -46,60 +51,63 @@ def rule_scansion(input, correption=True):
             sylls[idx] = syll[:-1]
             sylls[idx + 1] = syll[-1] + next_syll
 
-    line = ""
+    line = []
 
     for idx, syll in enumerate(sylls):
         next_syll = sylls[idx + 1] if idx + 1 < len(sylls) else ""
 
-        syll_clean = re.sub(to_clean, "", syll.strip())
-        next_syll_clean = re.sub(to_clean, "", next_syll.strip())
-
-        # preempt vowel hiatus and correption
-        if correption:
-            if next_syll and (vowel(syll_clean[-1]) and vowel(next_syll_clean[0]) and (syll.endswith(" ") or next_syll.startswith(" "))):
-                    line = line + "{" + f"{syll}" + "}"
-
-            elif any("_" in char for char in syll):
-                line = line + "[" + f"{syll}" + "]"
-            elif syll_clean[-1] == "^":
-                line = line + "{" + f"{syll}" + "}"
-            elif heavy_syll(syll):
-                line = line + "[" + f"{syll}" + "]"
-            else:
-                line = line + "{" + f"{syll}" + "}"
+        syll_clean = to_clean.sub("", syll.strip())
+
+        # preempt vowel hiatus and correption (only then is the cleaned next syll needed)
+        if correption and next_syll and (vowel(syll_clean[-1]) and vowel(to_clean.sub("", next_syll.strip())[0]) and (syll.endswith(" ") or next_syll.startswith(" "))):
+            line.append(f"{{{syll}}}")
+        elif "_" in syll:
+            line.append(f"[{syll}]")
+        elif syll_clean[-1] == "^":
+            line.append(f"{{{syll}}}")
+        elif heavy_syll(syll):
+            line.append(f"[{syll}]")
         else:
-            if any("_" in char for char in syll):
-                line = line + "[" + f"{syll}" + "]"
-            elif syll_clean[-1] == "^":
-                line = line + "{" + f"{syll}" + "}"
-            elif heavy_syll(syll):
-                line = line + "[" + f"{syll}" + "]"
-            else:
-                line = line + "{" + f"{syll}" + "}"
-
-    return line
-
-def scan_xml(input_file, output_file, debug=False):
+            line.append(f"{{{syll}}}")
+
+    return "".join(line)
+
+def scan_xml(input_file, output_file, debug=False, workers=1):
     '''
     Adds [] and {} syllable boundaries to a macronized TEI XML file.
+
+    workers: with workers > 1, the lines are scanned in a process pool, since every line is scanned on its own
     '''
     # 🔽 Use parser with remove_blank_text=True
     parser = etree.XMLParser(remove_blank_text=True)
     tree = etree.parse(input_file, parser)
     root = tree.getroot()
 
-    for idx, l in tqdm(enumerate(root.findall(".//l"))):
-        text = l.xpath("string()").strip()
+    # Collect all line texts first, so that every distinct text (refrains, repeated baseline lines) is scanned only once
+    lines = root.findall(".//l")
+    # A line without children (the usual case in macronized files) is just its .text, with no itertext walk
+    texts = [("".join(l.itertext()) if len(l) else l.text or "").strip() for l in lines]
+
+    to_scan = [text for text in dict.fromkeys(texts) if text] # a blank line has nothing to scan
+    if workers > 1 and len(to_scan) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(to_scan))) as executor:
+            scanned_texts = list(tqdm(executor.map(rule_scansion, to_scan, chunksize=64), total=len(to_scan)))
+    else:
+        scanned_texts = [rule_scansion(text) for text in tqdm(to_scan)]
+
+    scansions = dict(zip(to_scan, scanned_texts))
+    scansions[""] = ""
+
+    for idx, (l, text) in enumerate(zip(lines, texts)):
         if debug:
             print(f"Line {idx+1}: {text}")
-        scanned = rule_scansion(text)
+        scanned = scansions[text]
 
         if scanned is None:
             continue
 
-        # Remove all children but preserve attributes
-        for child in l:
-            l.remove(child)
+        # Remove all children but preserve attributes, in one slice deletion
+        del l[:]
         l.text = scanned
         l.tail = None  # Clear any tail text
 
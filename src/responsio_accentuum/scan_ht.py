@@ -9,16 +9,48 @@
 Making scanned XML files from Hypotactic data, to be compiled.
 '''
 
-from bs4 import BeautifulSoup
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import sys
+from functools import partial
+
+from lxml import etree, html
+
+# Compiled once; the class tests mirror BeautifulSoup's: class_='poem' matches the whole token,
+# whereas the syll and line tests match substrings of tokens (e.g. "syll long", "line checked")
+_poem_divs = etree.XPath(".//div[contains(concat(' ', normalize-space(@class), ' '), ' poem ')]")
+_strophe_divs = etree.XPath(".//div[@data-strophe]")
+_line_divs = etree.XPath("./div[contains(@class, 'line')]")
+_word_spans = etree.XPath(".//span[contains(concat(' ', normalize-space(@class), ' '), ' word ')]")
+_syll_spans = etree.XPath(".//span[contains(@class, 'syll')]")
+
+# Brackets for short and long syllables
+_BRACKETS = {'short': ("{", "}"), 'long': ("[", "]")}
+
+def _extract_syllables(div_element):
+    """
+    The syllable extraction of extract_syllables_from_div without any debug checks,
+    for the lines of whole files.
+    """
+    parts = []
+    word_spans = _word_spans(div_element)
+    last_word = len(word_spans) - 1
+    for word_index, word_span in enumerate(word_spans):
+        syll_spans = _syll_spans(word_span)
+        space_at = len(syll_spans) - 1 if word_index != last_word else -1
+        for syll_index, span in enumerate(syll_spans):
+            classes = frozenset(span.get('class', '').split())
+            brackets = _BRACKETS.get('short' if 'short' in classes else 'long' if 'long' in classes else None)
+            if brackets is not None:
+                prefix = "€" if 'resolved' in classes else "#" if 'anceps' in classes else ""
+                opening, closing = brackets
+                parts += (opening, prefix, span.text_content(), " " if syll_index == space_at else "", closing)
+    return "".join(parts)
 
 def extract_syllables_from_div(div_element, debug=False):
     """
     Extract syllable content from a div element and format with brackets.
     
     Args:
-        div_element: BeautifulSoup div element or HTML string
+        div_element: lxml div element or HTML string
         debug: If True, print debug information
         
     Returns:
@@ -26,27 +58,32 @@ def extract_syllables_from_div(div_element, debug=False):
     """
     # If div_element is a string, parse it
     if isinstance(div_element, str):
-        soup = BeautifulSoup(div_element, 'html.parser')
-        div_element = soup.find('div')
+        fragment = html.fromstring(div_element)
+        div_element = fragment if fragment.tag == 'div' else fragment.find('.//div')
+    
+    if not debug:
+        return _extract_syllables(div_element)
     
-    result = ""
+    # The debug path below mirrors _extract_syllables line for line
+    parts = []
     
     # Find all word spans to preserve word boundaries
-    word_spans = div_element.find_all('span', class_='word')
-    if debug:
-        print(f"      Found {len(word_spans)} word spans")
+    word_spans = _word_spans(div_element)
+    print(f"      Found {len(word_spans)} word spans")
     
+    last_word = len(word_spans) - 1
     for word_index, word_span in enumerate(word_spans):
         # Find all syll spans within this word
-        syll_spans = word_span.find_all('span', class_=lambda x: x and 'syll' in x)
-        if debug:
-            print(f"        Word {word_index + 1}: {len(syll_spans)} sylls")
+        syll_spans = _syll_spans(word_span)
+        last_syll = len(syll_spans) - 1
+        # Only the last syllable of a word gets the space, and never in the last word of the line
+        space_at = last_syll if word_index != last_word else -1
+        print(f"        Word {word_index + 1}: {len(syll_spans)} sylls")
         
         for syll_index, span in enumerate(syll_spans):
-            classes = span.get('class', [])
-            content = span.get_text()
-            if debug:
-                print(f"          Span: classes={classes}, content='{content}'")
+            classes = frozenset(span.get('class', '').split())
+            content = span.text_content()
+            print(f"          Span: classes={classes}, content='{content}'")
             
             # Check for special modifiers
             prefix = ""
@@ -55,19 +92,16 @@ def extract_syllables_from_div(div_element, debug=False):
             elif 'anceps' in classes:
                 prefix = "#"
             
-            # Check if this is the last syllable of the word and not the last word
-            is_last_syll_of_word = (syll_index == len(syll_spans) - 1)
-            is_not_last_word = (word_index < len(word_spans) - 1)
-            add_space = is_last_syll_of_word and is_not_last_word
+            add_space = syll_index == space_at
             
-            # Determine bracket type based on short/long
-            if 'short' in classes:
-                result += "{" + prefix + content + (" " if add_space else "") + "}"
-            elif 'long' in classes:
-                result += "[" + prefix + content + (" " if add_space else "") + "]"
+            # Determine bracket type based on short/long (short wins if both are present)
+            brackets = _BRACKETS.get('short' if 'short' in classes else 'long' if 'long' in classes else None)
+            if brackets is not None:
+                opening, closing = brackets
+                parts += (opening, prefix, content, " " if add_space else "", closing)
     
-    if debug:
-        print(f"      Final result: '{result}'")
+    result = "".join(parts)
+    print(f"      Final result: '{result}'")
     return result
 
 def extract_strophic_syllables_from_html(file_path, debug=False):
@@ -86,13 +120,15 @@ def extract_strophic_syllables_from_html(file_path, debug=False):
     """
     if debug:
         print(f"Processing file: {file_path}")
-    with open(file_path, 'r', encoding='utf-8') as file:
-        soup = BeautifulSoup(file, 'html.parser')
+    tree = html.parse(file_path, html.HTMLParser(encoding='utf-8'))
+    
+    # Chosen once, so that the per-line calls carry no debug checks unless debugging
+    extract_syllables = partial(extract_syllables_from_div, debug=True) if debug else _extract_syllables
     
     result = {}
     
     # Find all div elements with class="poem"
-    poem_divs = soup.find_all('div', class_='poem')
+    poem_divs = _poem_divs(tree)
     if debug:
         print(f"Found {len(poem_divs)} poem divs")
     
@@ -104,7 +140,7 @@ def extract_strophic_syllables_from_html(file_path, debug=False):
         result[poem_index] = {}
         
         # Find all div elements that have data-strophe attribute within this poem
-        strophe_divs = poem_div.find_all('div', attrs={'data-strophe': True})
+        strophe_divs = _strophe_divs(poem_div)
         if debug:
             print(f"Found {len(strophe_divs)} strophe divs in poem {poem_index}")
         
@@ -114,7 +150,7 @@ def extract_strophic_syllables_from_html(file_path, debug=False):
             strophe_num = strophe_div.get('data-strophenum', '1')
             if debug:
                 print(f"  Strophe {i+1}: type='{strophe_type}', num='{strophe_num}'")
-                print(f"  Classes: {strophe_div.get('class', [])}")
+                print(f"  Classes: {strophe_div.get('class', '').split()}")
             
             # Create the key based on strophe type and number
             if strophe_type == 'Strophe':
@@ -135,29 +171,17 @@ def extract_strophic_syllables_from_html(file_path, debug=False):
             # Find all child div elements with "line" in class
             line_syllables = []
             
-            # Look for line divs that are direct children
-            all_child_divs = strophe_div.find_all('div', recursive=True)
-            if debug:
-                print(f"    Found {len(all_child_divs)} total child divs")
-            
-            # Filter for line divs
-            child_line_divs = []
-            for div in all_child_divs:
-                div_classes = div.get('class', [])
-                if debug:
-                    print(f"      Checking div with classes: {div_classes}")
-                if any('line' in str(cls) for cls in div_classes):
-                    child_line_divs.append(div)
-                    if debug:
-                        print(f"        -> This is a line div!")
+            # Look for line divs that are direct children (the only place Hypotactic puts them),
+            # so that the words and sylls below them are never visited here
+            child_line_divs = _line_divs(strophe_div)
             
             if debug:
                 print(f"    Found {len(child_line_divs)} child line divs")
             
             for j, line_div in enumerate(child_line_divs):
                 if debug:
-                    print(f"      Child line {j+1}: classes {line_div.get('class', [])}")
-                syllables = extract_syllables_from_div(line_div, debug=debug)
+                    print(f"      Child line {j+1}: classes {line_div.get('class', '').split()}")
+                syllables = extract_syllables(line_div)
                 if debug:
                     print(f"      Extracted syllables: '{syllables}'")
                 if syllables:
@@ -170,7 +194,7 @@ def extract_strophic_syllables_from_html(file_path, debug=False):
     
     return result
 
-def create_tei_xml(poems_dict, title, prefix, output_file, author="Pindar", debug=False):
+def create_tei_xml(poems_dict, title, prefix, output_file, author="Pindar", debug=False, return_xml=None):
     """
     Create TEI XML from the poems dictionary in three versions.
     
@@ -180,23 +204,22 @@ def create_tei_xml(poems_dict, title, prefix, output_file, author="Pindar", debu
         author: Author name
         output_file: Optional base path to save the XML files (will create 3 versions)
         debug: If True, print debug information
+        return_xml: Whether to build and return the XML strings; by default only when there is no output_file,
+            so that writing the files doesn't serialize every version a second time
         
     Returns:
-        tuple: (triads_xml, epodes_xml, strophes_xml) - Pretty-printed XML strings
+        tuple: (triads_xml, epodes_xml, strophes_xml) - Pretty-printed XML strings, or None if not return_xml
     """
     
     def create_base_structure():
-        """Create base TEI structure"""
-        tei = ET.Element('TEI')
-        tei_header = ET.SubElement(tei, 'teiHeader')
-        file_desc = ET.SubElement(tei_header, 'fileDesc')
-        title_stmt = ET.SubElement(file_desc, 'titleStmt')
-        title_elem = ET.SubElement(title_stmt, 'title')
-        title_elem.text = title
-        author_elem = ET.SubElement(title_stmt, 'author')
-        author_elem.text = author
-        text = ET.SubElement(tei, 'text')
-        body = ET.SubElement(text, 'body')
+        """Create the TEI root with its teiHeader, returning the root and the empty body"""
+        tei = etree.Element('TEI')
+        tei_header = etree.SubElement(tei, 'teiHeader')
+        file_desc = etree.SubElement(tei_header, 'fileDesc')
+        title_stmt = etree.SubElement(file_desc, 'titleStmt')
+        etree.SubElement(title_stmt, 'title').text = title
+        etree.SubElement(title_stmt, 'author').text = author
+        body = etree.SubElement(etree.SubElement(tei, 'text'), 'body')
         return tei, body
     
     def get_strophe_type(strophe_key):
@@ -209,65 +232,48 @@ def create_tei_xml(poems_dict, title, prefix, output_file, author="Pindar", debu
             return 'epode'
         return 'strophe'
     
-    def sort_strophes(strophe_keys):
-        """Sort strophes in triadic order"""
-        return sorted(strophe_keys, key=lambda x: (
-            int(x.split('_')[-1]),
-            0 if 'strophe_' in x and 'anti' not in x else (1 if 'antistrophe' in x else 2)
-        ))
+    def mark_first_line(numbered_lines, section_type):
+        """(n, metre, text) triples for a section whose first line starts an antistrophe or epode"""
+        if not numbered_lines:
+            return []
+        (line_num, _, line_content), *rest = numbered_lines
+        return [(line_num, section_type, line_content), *rest]
     
-    def add_lines(parent_elem, lines, start_line_num, section_type=None):
-        """Add line elements to parent"""
-        line_num = start_line_num
-        for i, line_content in enumerate(lines):
-            l_elem = ET.SubElement(parent_elem, 'l')
-            l_elem.set('n', str(line_num))
-            # Mark first line of antistrophe or epode sections
-            if i == 0 and section_type in ['antistrophe', 'epode']:
-                l_elem.set('metre', section_type)
-            else:
-                l_elem.set('metre', '')
-            l_elem.text = line_content
-            line_num += 1
-        return line_num
-    
-    def add_lines_with_absolute_numbering(parent_elem, lines, start_line_num, section_type=None):
-        """Add line elements to parent with absolute line numbering"""
-        line_num = start_line_num
-        for i, line_content in enumerate(lines):
-            l_elem = ET.SubElement(parent_elem, 'l')
-            l_elem.set('n', str(line_num))
-            # Mark first line of antistrophe or epode sections
-            if i == 0 and section_type in ['antistrophe', 'epode']:
-                l_elem.set('metre', section_type)
-            else:
-                l_elem.set('metre', '')
-            l_elem.text = line_content
-            line_num += 1
-        return line_num
+    def build_tei(cantica):
+        """The tree of one version, built from its (responsion_id, strophes) cantica"""
+        tei, body = create_base_structure()
+        for responsion_id, strophes in cantica:
+            canticum = etree.SubElement(body, 'canticum')
+            for lines in strophes:
+                strophe = etree.SubElement(canticum, 'strophe', type='strophe', responsion=responsion_id)
+                for line_num, metre, line_content in lines:
+                    etree.SubElement(strophe, 'l', n=line_num, metre=metre).text = line_content
+        return etree.ElementTree(tei)
     
-    def prettify_xml(tei):
-        """Convert to pretty-printed XML string"""
-        xml_str = ET.tostring(tei, encoding='unicode')
-        dom = minidom.parseString(xml_str)
-        pretty_xml = dom.toprettyxml(indent='  ')
-        return '\n'.join([line for line in pretty_xml.split('\n') if line.strip()])
+    # Each version is laid out as a list of (responsion_id, strophes) cantica, every strophe a list of
+    # (n, metre, text) triples sharing the strings of poems_dict; the tree of a version is only built
+    # when it is written or returned, one version at a time
     
     # VERSION 1: Merged triads (strophe + antistrophe + epode = one strophe element)
-    tei_triads, body_triads = create_base_structure()
+    cantica_triads = []
     
     # VERSION 2: Epodes only
-    tei_epodes, body_epodes = create_base_structure()
+    cantica_epodes = []
     
     # VERSION 3: Strophes and antistrophes as separate elements (no epodes)
-    tei_strophes, body_strophes = create_base_structure()
+    cantica_strophes = []
     
     for poem_num in sorted(poems_dict.keys()):
         poem_data = poems_dict[poem_num]
         
+        # Interned, as every strophe of the poem in all three versions carries it
+        responsion_id = sys.intern(f'{prefix}{poem_num:02d}')
+        
         # Create cantica for each version
-        canticum_triads = ET.SubElement(body_triads, 'canticum')
-        canticum_epodes = ET.SubElement(body_epodes, 'canticum')
+        strophes_triads = []
+        strophes_epodes = []
+        cantica_triads.append((responsion_id, strophes_triads))
+        cantica_epodes.append((responsion_id, strophes_epodes))
         
         # Check if this poem has at least one strophe AND one antistrophe
         has_strophe = any(key.startswith('strophe_') for key in poem_data.keys())
@@ -275,19 +281,16 @@ def create_tei_xml(poems_dict, title, prefix, output_file, author="Pindar", debu
         include_in_version3 = has_strophe and has_antistrophe
         
         # Only create canticum for version 3 if it has both strophes and antistrophes
-        canticum_strophes = ET.SubElement(body_strophes, 'canticum') if include_in_version3 else None
-        
-        # Sort strophes
-        strophe_keys = sort_strophes(list(poem_data.keys()))
+        if include_in_version3:
+            strophes_strophes = []
+            cantica_strophes.append((responsion_id, strophes_strophes))
         
-        # Group by triad number
+        # Group by triad number; the triads are visited in sorted order below and their parts by name,
+        # so the keys needn't be sorted first
         triads = {}
-        for key in strophe_keys:
-            num = int(key.split('_')[-1])
-            if num not in triads:
-                triads[num] = {}
-            strophe_type = get_strophe_type(key)
-            triads[num][strophe_type] = poem_data[key]
+        for key, lines in poem_data.items():
+            num = int(key.rsplit('_', 1)[-1])
+            triads.setdefault(num, {})[get_strophe_type(key)] = lines
         
         # Process each triad
         line_num_global = 1  # Global line number counter for absolute numbering
@@ -295,86 +298,64 @@ def create_tei_xml(poems_dict, title, prefix, output_file, author="Pindar", debu
         for triad_num in sorted(triads.keys()):
             triad = triads[triad_num]
             
-            # Calculate line numbers for each section in this triad
-            strophe_start = line_num_global
-            strophe_lines = len(triad.get('strophe', []))
-            
-            antistrophe_start = strophe_start + strophe_lines
-            antistrophe_lines = len(triad.get('antistrophe', []))
-            
-            epode_start = antistrophe_start + antistrophe_lines
-            epode_lines = len(triad.get('epode', []))
+            # Number the lines of each section once; all three versions share these (n, metre, text) triples
+            sections = {}
+            for section_type in ('strophe', 'antistrophe', 'epode'):
+                if section_type in triad:
+                    sections[section_type] = [(str(n), '', line_content) for n, line_content in enumerate(triad[section_type], start=line_num_global)]
+                    line_num_global += len(triad[section_type])
             
             # VERSION 1: Merged triad
-            strophe_elem_triads = ET.SubElement(canticum_triads, 'strophe')
-            strophe_elem_triads.set('type', 'strophe')
-            strophe_elem_triads.set('responsion', f'{prefix}{poem_num:02d}')
+            lines_triads = []
             
-            current_line = line_num_global
             # Add strophe lines (no special marking for first line)
-            if 'strophe' in triad:
-                current_line = add_lines(strophe_elem_triads, triad['strophe'], current_line)
+            if 'strophe' in sections:
+                lines_triads += sections['strophe']
             
             # Add antistrophe lines (mark first line)
-            if 'antistrophe' in triad:
-                current_line = add_lines(strophe_elem_triads, triad['antistrophe'], current_line, 'antistrophe')
+            if 'antistrophe' in sections:
+                lines_triads += mark_first_line(sections['antistrophe'], 'antistrophe')
             
             # Add epode lines (mark first line)
-            if 'epode' in triad:
-                current_line = add_lines(strophe_elem_triads, triad['epode'], current_line, 'epode')
+            if 'epode' in sections:
+                lines_triads += mark_first_line(sections['epode'], 'epode')
+            
+            strophes_triads.append(lines_triads)
             
             # VERSION 2: Epodes only (with absolute line numbering)
-            if 'epode' in triad:
-                strophe_elem_epodes = ET.SubElement(canticum_epodes, 'strophe')
-                strophe_elem_epodes.set('type', 'strophe')
-                strophe_elem_epodes.set('responsion', f'{prefix}{poem_num:02d}')
-                add_lines_with_absolute_numbering(strophe_elem_epodes, triad['epode'], epode_start)
+            if 'epode' in sections:
+                strophes_epodes.append(sections['epode'])
             
             # VERSION 3: Strophes and antistrophes as separate elements (with absolute line numbering)
             # Only add if this poem qualifies for version 3
             if include_in_version3:
-                if 'strophe' in triad:
-                    strophe_elem_strophes = ET.SubElement(canticum_strophes, 'strophe')
-                    strophe_elem_strophes.set('type', 'strophe')
-                    strophe_elem_strophes.set('responsion', f'{prefix}{poem_num:02d}')
-                    add_lines_with_absolute_numbering(strophe_elem_strophes, triad['strophe'], strophe_start)
+                if 'strophe' in sections:
+                    strophes_strophes.append(sections['strophe'])
                 
-                if 'antistrophe' in triad:
-                    antistrophe_elem = ET.SubElement(canticum_strophes, 'strophe')
-                    antistrophe_elem.set('type', 'strophe')
-                    antistrophe_elem.set('responsion', f'{prefix}{poem_num:02d}')
-                    add_lines_with_absolute_numbering(antistrophe_elem, triad['antistrophe'], antistrophe_start)
-            
-            # Update global line counter for next triad
-            line_num_global = current_line
+                if 'antistrophe' in sections:
+                    strophes_strophes.append(sections['antistrophe'])
     
-    # Prettify all versions
-    xml_triads = prettify_xml(tei_triads)
-    xml_epodes = prettify_xml(tei_epodes)
-    xml_strophes = prettify_xml(tei_strophes)
+    versions = (('triads', 'merged triads', cantica_triads),
+                ('epodes', 'epodes only', cantica_epodes),
+                ('strophes', 'strophes/antistrophes as separate elements', cantica_strophes))
     
-    # Save to files if requested
+    # Save to files if requested, letting lxml write the declaration and the indentation
     if output_file:
         # Remove extension if present
         base_path = output_file.rsplit('.', 1)[0] if '.' in output_file else output_file
         
-        # Save version 1: merged triads (with starts of antistrophes and epodes marked)
-        with open(f"{base_path}_triads.xml", 'w', encoding='utf-8') as f:
-            f.write(xml_triads)
-        if debug:
-            print(f"TEI XML (merged triads) saved to: {base_path}_triads.xml")
-        
-        # Save version 2: epodes only
-        with open(f"{base_path}_epodes.xml", 'w', encoding='utf-8') as f:
-            f.write(xml_epodes)
-        if debug:
-            print(f"TEI XML (epodes only) saved to: {base_path}_epodes.xml")
-        
-        # Save version 3: strophes and antistrophes as separate elements
-        with open(f"{base_path}_strophes.xml", 'w', encoding='utf-8') as f:
-            f.write(xml_strophes)
-        if debug:
-            print(f"TEI XML (strophes/antistrophes as separate elements) saved to: {base_path}_strophes.xml")
+        for suffix, description, cantica in versions:
+            build_tei(cantica).write(f"{base_path}_{suffix}.xml", encoding='UTF-8', xml_declaration=True, pretty_print=True)
+            if debug:
+                print(f"TEI XML ({description}) saved to: {base_path}_{suffix}.xml")
     
-    return xml_triads, xml_epodes, xml_strophes
+    if return_xml is None:
+        return_xml = not output_file
+    if not return_xml:
+        return None
 
+    # Prettify all versions
+    return tuple(
+        etree.tostring(build_tei(cantica), encoding='UTF-8', xml_declaration=True, pretty_print=True).decode('utf-8').rstrip('\n')
+        for _, _, cantica in versions
+    )
@@ -6,6 +6,7 @@
 # See the LICENSE file in the project root for full details.
 
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import logging
 import os
 from lxml import etree
@@ -52,13 +53,24 @@ accents = {
     )
 }
 
+###############################################################################
+# PRECOMPILED XPATHS
+###############################################################################
+# Compiled once here instead of on every call; the responsion is bound as the variable $rid
+_strophes_by_responsion = etree.XPath('//strophe[@responsion=$rid]')
+_strophes_with_responsion = etree.XPath('//strophe[@responsion]')
+_canticum_strophes = etree.XPath('//strophe[@responsion=$rid] | //antistrophe[@responsion=$rid]')
+_canticum_lines = etree.XPath('(//strophe[@responsion=$rid] | //antistrophe[@responsion=$rid])//l')
+_canticum_sylls = etree.XPath('//strophe[@responsion=$rid]//syll | //antistrophe[@responsion=$rid]//syll')
+_all_strophes = etree.XPath('//strophe | //antistrophe') # union is more readable XPath than [self::foo or self::bar] predicates
+
 ###############################################################################
 # 0) UTILITY FUNCTIONS
 ###############################################################################
 
 
 def polystrophic(tree, responsion):
-    strophes = tree.xpath(f'//strophe[@responsion="{responsion}"]')
+    strophes = _strophes_by_responsion(tree, rid=responsion)
     return len(strophes) > 2
 
 
@@ -95,7 +107,7 @@ def count_all_syllables(tree):
 def count_all_syllables_canticum(tree, responsion):
 
     canticum_count = 0
-    lines = tree.xpath(f'(//strophe[@responsion="{responsion}"] | //antistrophe[@responsion="{responsion}"])//l')
+    lines = _canticum_lines(tree, rid=responsion)
 
     for line in lines:
         syllable_list = canonical_sylls(line)
@@ -114,19 +126,25 @@ def count_all_accents_line(l):
     """
     counts = {'acute': 0, 'grave': 0, 'circumflex': 0}
 
-    # Select all syllables inside the given <l> element
-    all_sylls = l.xpath('.//syll')
+    # Walk all syllables inside the given <l> element
+    _add_accent_counts(counts, l.iter('syll'))
+
+    return counts
+
 
-    for syll in all_sylls:
-        text = syll.text or ""
-        norm_text = normalize_word(text)
+def _add_accent_counts(counts, sylls):
+    """
+    Adds to counts the number of syllables carrying each accent type, in a single pass over sylls:
+    every syllable's characters are turned into a set once and checked against all three accent sets,
+    instead of scanning the text once per accent character.
+    """
+    for syll in sylls:
+        chars = set(normalize_word(syll.text or ""))
 
         for accent_type, accent_chars in accents.items():
-            if any(char in norm_text for char in accent_chars):
+            if not accent_chars.isdisjoint(chars):
                 counts[accent_type] += 1
 
-    return counts
-
 
 def count_all_accents_canticum(tree, responsion):
     """
@@ -136,15 +154,9 @@ def count_all_accents_canticum(tree, responsion):
     counts = {'acute': 0, 'grave': 0, 'circumflex': 0}
 
     # XPath to select syllables within strophes and antistrophes for the given responsion
-    all_sylls = tree.xpath(f'//strophe[@responsion="{responsion}"]//syll | //antistrophe[@responsion="{responsion}"]//syll')
-
-    for syll in all_sylls:
-        text = syll.text or ""
-        norm_text = normalize_word(text)
+    all_sylls = _canticum_sylls(tree, rid=responsion)
 
-        for accent_type, accent_chars in accents.items():
-            if any(char in norm_text for char in accent_chars):
-                counts[accent_type] += 1
+    _add_accent_counts(counts, all_sylls)
 
     return counts
 
@@ -152,32 +164,48 @@ def count_all_accents_canticum(tree, responsion):
 def count_all_accents(tree):
     """
     Counts all occurrences of acute, grave, and circumflex accents across all
-    strophes and antistrophes in the entire XML tree by summing results
-    from count_all_accents_canticum for all cantica.
+    strophes and antistrophes in the entire XML tree, i.e. the sum of
+    count_all_accents_canticum over all cantica, but in a single walk over
+    the strophes instead of one whole-tree XPath per canticum.
     """
     total_counts = {'acute': 0, 'grave': 0, 'circumflex': 0}
 
     # Get all unique responsion IDs in the tree
-    responsion_ids = {strophe.get('responsion') for strophe in tree.xpath('//strophe[@responsion]')}
-
-    # Accumulate counts from each responsion
-    for responsion in responsion_ids:
-        canticum_counts = count_all_accents_canticum(tree, responsion)
-        for accent_type, count in canticum_counts.items():
-            total_counts[accent_type] += count
+    responsion_ids = {strophe.get('responsion') for strophe in _strophes_with_responsion(tree)}
+
+    # Every strophe and antistrophe belonging to one of them, in document order
+    sylls = (
+        syll
+        for strophe in _all_strophes(tree)
+        if strophe.get('responsion') in responsion_ids
+        for syll in strophe.iter('syll')
+    )
+    _add_accent_counts(total_counts, sylls)
 
     return total_counts
 
 
-def count_all_accents_corpus(folder, exclude_substr=None, include_substr=None):
+def _count_all_accents_file_or_none(filepath):
+    """count_all_accents for one file of a corpus, reporting a failing file instead of aborting the corpus."""
+    try:
+        return count_all_accents(etree.parse(filepath))
+    except Exception as e:
+        print(f"Error processing {filepath.name}: {e}")
+        return None
+
+
+def count_all_accents_corpus(folder, exclude_substr=None, include_substr=None, workers=1):
     """
     Run with exclude_substr="baseline" to include only the plays!
     Run with include_substr="baseline" to include only the baselines!
+
+    workers: with workers > 1, the files are parsed and counted in a process pool, since they are independent of each other.
     """
     master_counts = {'acute': 0, 'grave': 0, 'circumflex': 0}
 
     folder_path = _resolve_path(folder)
 
+    filepaths = []
     for filename in os.listdir(folder_path):
         if not filename.endswith('.xml'):
             continue
@@ -185,15 +213,19 @@ def count_all_accents_corpus(folder, exclude_substr=None, include_substr=None):
             continue
         if include_substr and include_substr not in filename:
             continue
+        filepaths.append(folder_path / filename)
 
-        filepath = folder_path / filename
-        try:
-            tree = etree.parse(filepath)
-            file_counts = count_all_accents(tree)
-            for accent_type, count in file_counts.items():
-                master_counts[accent_type] += count
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
+    if workers > 1 and len(filepaths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(filepaths))) as executor:
+            results = list(executor.map(_count_all_accents_file_or_none, filepaths, chunksize=4))
+    else:
+        results = [_count_all_accents_file_or_none(filepath) for filepath in filepaths]
+
+    for file_counts in results:
+        if file_counts is None:
+            continue
+        for accent_type, count in file_counts.items():
+            master_counts[accent_type] += count
 
     return master_counts
 
@@ -285,7 +317,14 @@ def metrically_responding_lines_polystrophic(*strophes):
     NB: Used very widely in the codebase!
     NB: Philosophy should be that the burden of asserting and printing errors is on the caller. This function should be lean. 
     """
-    strophe_lines = [canonical_sylls(strophe) for strophe in strophes]
+    return metrically_responding_canonical(*[canonical_sylls(strophe) for strophe in strophes])
+
+
+def metrically_responding_canonical(*strophe_lines):
+    """
+    Same check as metrically_responding_lines_polystrophic, but on lines already run through canonical_sylls,
+    so that callers who need the canonical syllables anyway (e.g. for diffs) don't derive them twice.
+    """
     all_checks_pass = True
 
     # Check 1: Line lengths
@@ -763,7 +802,7 @@ def accentual_responsion_metric_canticum(xml_file, canticum) -> dict:
 
     tree = etree.parse(xml_file)
 
-    strophes = tree.xpath(f'//strophe[@responsion="{canticum}"] | //antistrophe[@responsion="{canticum}"]')
+    strophes = _canticum_strophes(tree, rid=canticum)
 
     accent_maps = accentually_responding_syllables_of_strophes_polystrophic(*strophes)
 
@@ -826,7 +865,7 @@ def accentual_responsion_metric_play(xml_file) -> dict:
 
     xml_file = _resolve_path(xml_file)
     tree = etree.parse(xml_file)
-    strophes = tree.xpath('//strophe | //antistrophe') # union is more readable XPath than [self::foo or self::bar] predicates
+    strophes = _all_strophes(tree)
 
     cantica = defaultdict(list)
     for s in strophes:
@@ -891,7 +930,7 @@ def accentual_responsion_metric_corpus(folder="data/compiled/", exclude_substr="
         
         filepath = folder_path / xml_file
         tree = etree.parse(filepath)
-        strophes = tree.xpath('//strophe | //antistrophe')
+        strophes = _all_strophes(tree)
 
         cantica = defaultdict(list)
         for s in strophes:
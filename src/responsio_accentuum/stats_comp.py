@@ -29,8 +29,13 @@ subject to the following MIT license:
     SOFTWARE.
 '''
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from fractions import Fraction as F
+import hashlib
+from itertools import repeat
 from lxml import etree
+import numpy as np
 import os
 from statistics import mean
 from tqdm import tqdm
@@ -38,7 +43,7 @@ from tqdm import tqdm
 from grc_utils import is_enclitic, is_proclitic
 
 from .stats import accents, metrically_responding_lines_polystrophic
-from .utils.utils import space_after, space_before
+from .utils.utils import count_responsions_streaming, parse_xml_root, space_after, space_before
 
 
 def get_contours_line(l_element) -> list[str]:
@@ -172,6 +177,11 @@ def all_contours_line(*xml_lines) -> list[list[str]]:
     return grouped_contours
 
 
+# Contours that match a rise or a fall respectively; N matches both
+_UP_CONTOURS = frozenset(('UP', 'UP-G', 'N'))
+_DOWN_CONTOURS = frozenset(('DN', 'DN-A', 'N'))
+
+
 def _compatibility_line(*xml_lines, fractional=True) -> list[F | float]:
     '''
     Computes the contour of a line from a set of responding strophes,
@@ -196,26 +206,21 @@ def _compatibility_line(*xml_lines, fractional=True) -> list[F | float]:
     position_lists = all_contours_line(*xml_lines)
     for position in position_lists: # position K = [contourK_line1, contourK_line2, ..., contourK_lineN], where N is number of resp. strophes
         
-        all_resolved = True
-        for strophe in position:
-            if isinstance(strophe, list): # only resolved positions are lists
-                continue
-            else:
-                all_resolved = False
-                break
+        all_resolved = all(isinstance(strophe, list) for strophe in position) # only resolved positions are lists
 
-        up = []
-        down = []
+        # Only the sizes of the two groups matter, so count rather than collect
+        up = 0
+        down = 0
 
         for strophe in position: # this is in an invididual syllable's contour
             if isinstance(strophe, list): # checking sublists of two resolved syllable contours
                 if all_resolved == True: # proceed as normal if all strophes resolve
                     print('\033[31mComparing resolved positions...\033[0m')
                     for resolved_syll in strophe:
-                        if resolved_syll in ['UP', 'UP-G', 'N']:
-                            up.append(resolved_syll)
-                        elif resolved_syll in ['DN', 'DN-A', 'N']:
-                            down.append(resolved_syll)
+                        if resolved_syll in _UP_CONTOURS:
+                            up += 1
+                        elif resolved_syll in _DOWN_CONTOURS:
+                            down += 1
                         else:
                             raise ValueError(f"Unknown contour {resolved_syll} in _compatibility_line.")
                 
@@ -242,27 +247,25 @@ def _compatibility_line(*xml_lines, fractional=True) -> list[F | float]:
                 else: # if all_resolved = False
                     print(f'\033[31mComparing resolved and unresolved positions...\033[0m')
                     resolved_1, resolved_2 = strophe
-                    resolved_position = resolved_1 + resolved_2
                     if resolved_1 == resolved_2 == 'N': # CASE 1
-                        up.append(resolved_position)
-                        down.append(resolved_position)
-                    elif all(x in ['UP', 'UP-G', 'N'] for x in [resolved_1, resolved_2]): # CASE 2
-                        up.append(resolved_position)
-                    elif all(x in ['DN', 'DN-A', 'N'] for x in [resolved_1, resolved_2]): # CASE 3
-                        down.append(resolved_position)
+                        up += 1
+                        down += 1
+                    elif resolved_1 in _UP_CONTOURS and resolved_2 in _UP_CONTOURS: # CASE 2
+                        up += 1
+                    elif resolved_1 in _DOWN_CONTOURS and resolved_2 in _DOWN_CONTOURS: # CASE 3
+                        down += 1
                     else: # CASE 4 - the problematic case of mixed contours => skip whole position in analysis (at least I find this safest for now)
                         continue # goes back to "for strophe in position" loop
 
-            elif strophe in ['UP', 'UP-G', 'N']:
-                up.append(strophe)
-
-            elif strophe in ['DN', 'DN-A', 'N']:
+            elif strophe in _UP_CONTOURS:
+                up += 1
 
-                down.append(strophe)
+            elif strophe in _DOWN_CONTOURS:
+                down += 1
             else:
                 raise ValueError(f"Unknown contour {strophe} in _compatibility_line.")
 
-        max_len = max(len(up), len(down)) # for even N, N/2 <= max_len <= N, otherwise N/2 < max_len < N
+        max_len = max(up, down) # for even N, N/2 <= max_len <= N, otherwise N/2 < max_len < N
         if fractional:
             position_compatibility_ratio = F(max_len, len(position))
         else:
@@ -272,33 +275,71 @@ def _compatibility_line(*xml_lines, fractional=True) -> list[F | float]:
     return compatibility_ratios
 
 
+# Compiled once, instead of per canticum and per play (the id is passed as an XPath variable)
+_strophes_by_responsion = etree.XPath('//strophe[@responsion=$rid]')
+_strophes_with_responsion = etree.XPath('//strophe[@responsion]')
+
+
+# Results of compatibility_canticum for files read from disk, keyed by content digest (see below)
+_COMPATIBILITY_CACHE_SIZE = 256
+_compatibility_cache = OrderedDict()
+
+
 def compatibility_canticum(xml_file_path, canticum_ID, fractional=True) -> list:
     """
     Compute compatibility ratios for each line position across all strophes in a canticum.
+
+    Results for files read from disk are memoized on (content digest, canticum_ID, fractional).
+    Keying on the content rather than the path and mtime keeps the cache correct for the
+    baseline temp files, which are rewritten under the same name many times per second.
     
     Args:
-        xml_file_path: Path to XML file
+        xml_file_path: Path to XML file, or its already parsed root
         canticum_ID: ID to match against strophe[@responsion]
         fractional: If True, return Fractions; otherwise return floats
     
     Returns:
         List of lists, where each inner list contains compatibility ratios for one line
     """
-    tree = etree.parse(xml_file_path)
-    root = tree.getroot()
+    if isinstance(xml_file_path, (etree._Element, etree._ElementTree)):
+        return _compatibility_canticum(parse_xml_root(xml_file_path), canticum_ID, fractional, xml_file_path)
+
+    with open(xml_file_path, "rb") as f:
+        data = f.read()
+    key = (hashlib.blake2b(data, digest_size=16).digest(), canticum_ID, fractional)
+
+    cached = _compatibility_cache.get(key)
+    if cached is None:
+        result = _compatibility_canticum(etree.fromstring(data), canticum_ID, fractional, xml_file_path)
+        cached = tuple(tuple(line) for line in result)
+        _compatibility_cache[key] = cached
+        if len(_compatibility_cache) > _COMPATIBILITY_CACHE_SIZE:
+            _compatibility_cache.popitem(last=False)
+    else:
+        _compatibility_cache.move_to_end(key)
+
+    # Fresh lists, so that callers can't mutate the cached entry
+    return [list(line) for line in cached]
 
-    strophes = root.xpath(f'//strophe[@responsion="{canticum_ID}"]')
+
+def _compatibility_canticum(root, canticum_ID, fractional, xml_file_path) -> list:
+    """
+    Does the actual work of compatibility_canticum on a parsed root.
+    xml_file_path is only used in error messages.
+    """
+    strophes = _strophes_by_responsion(root, rid=canticum_ID)
     if not strophes:
         raise ValueError(f"No strophes found with responsion={canticum_ID}")
     
-    num_lines = len([el for el in strophes[0] if el.tag == 'l']) # same for all, since they respond
+    # The <l> children of each strophe, gathered once rather than once per line position
+    strophe_lines = [[el for el in strophe if el.tag == 'l'] for strophe in strophes]
+    num_lines = len(strophe_lines[0]) # same for all, since they respond
     
     canticum_list_of_line_compatibility_ratio_lists = []
     
     for line_pos in range(num_lines):
         responding_lines = []
-        for strophe in strophes:
-            lines = [el for el in strophe if el.tag == 'l']
+        for lines in strophe_lines:
             if line_pos < len(lines):
                 responding_lines.append(lines[line_pos])
         
@@ -326,39 +367,77 @@ def compatibility_canticum(xml_file_path, canticum_ID, fractional=True) -> list:
     return normalized_canticum
 
 
+def compatibility_canticum_array(xml_file_path, canticum_ID):
+    """
+    compatibility_canticum as one dense float matrix, which is what the heatmaps want.
+    The ratios are written straight into a NaN-filled buffer in a single masked assignment,
+    instead of being padded row by row at the call site.
+
+    Returns:
+        (arr, row_lengths), where arr has shape (number of lines, longest line) with trailing NaN,
+        and row_lengths holds the number of positions of each line
+    """
+    canticum = compatibility_canticum(xml_file_path, canticum_ID)
+
+    row_lengths = np.fromiter((len(line) for line in canticum), dtype=np.intp, count=len(canticum))
+    arr = np.full((len(canticum), row_lengths.max(initial=0)), np.nan)
+    filled = np.arange(arr.shape[1]) < row_lengths[:, None] # row-major, like the flattened ratios below
+    arr[filled] = np.fromiter((float(ratio) for line in canticum for ratio in line), dtype=np.float64, count=int(row_lengths.sum()))
+
+    return arr, row_lengths
+
+
 def compatibility_play(xml_file_path, fractional=True):
     tree = etree.parse(xml_file_path)
     root = tree.getroot()
 
     cantica = set()
-    for strophe in root.xpath('//strophe[@responsion]'):
+    for strophe in _strophes_with_responsion(root):
         cantica.add(strophe.get('responsion'))
 
     list_of_lists_of_compatibility_per_position_lists = [] # for every canticum, compiling a list of one compatibility-per-position float list for every line
 
     for canticum in cantica:
-        result = compatibility_canticum(xml_file_path, canticum, fractional=fractional)
+        result = compatibility_canticum(root, canticum, fractional=fractional) # reuse the parsed root rather than reparsing per canticum
         list_of_lists_of_compatibility_per_position_lists.append(result)
     
     return list_of_lists_of_compatibility_per_position_lists
 
 
-def compatibility_corpus(dir_path, fractional=True, progress=True):
+def _compatibility_play_or_none(file_path, fractional=True):
+    '''compatibility_play for one file of a corpus, reporting a failing file instead of aborting the corpus.'''
+    try:
+        return compatibility_play(file_path, fractional=fractional)
+    except Exception as e:
+        print(f"Error processing {os.path.basename(file_path)}: {e}")
+        return None
+
+
+def compatibility_corpus(dir_path, fractional=True, progress=True, workers=1):
+    '''
+    workers: with workers > 1, the files are processed in a process pool, since they are independent of each other.
+    The results keep the order of the files either way.
+    '''
     corpus_compatibility_lists = []
     
     # Get all XML files in directory
     xml_files = [f for f in os.listdir(dir_path) if f.endswith('.xml')]
+    file_paths = [os.path.join(dir_path, xml_file) for xml_file in xml_files]
     
     # Process each XML file
-    iterator = tqdm(xml_files, initial=1) if progress else xml_files
-    for xml_file in iterator:
-        file_path = os.path.join(dir_path, xml_file)
-        try:
-            play_results = compatibility_play(file_path, fractional=fractional)
+    if workers > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(file_paths))) as executor:
+            results = executor.map(_compatibility_play_or_none, file_paths, repeat(fractional), chunksize=4)
+            if progress:
+                results = tqdm(results, total=len(file_paths), initial=1)
+            results = list(results)
+    else:
+        iterator = tqdm(file_paths, initial=1) if progress else file_paths
+        results = [_compatibility_play_or_none(file_path, fractional=fractional) for file_path in iterator]
+
+    for play_results in results:
+        if play_results is not None:
             corpus_compatibility_lists.append(play_results)
-        except Exception as e:
-            print(f"Error processing {xml_file}: {e}")
-            continue
             
     return corpus_compatibility_lists
 
@@ -388,16 +467,8 @@ def compatibility_strophicity(dir_path="compiled", mode="antistrophic", id="", f
     for xml_file in xml_files:
         file_path = os.path.join(dir_path, xml_file)
         try:
-            tree = etree.parse(file_path)
-            root = tree.getroot()
-
-            # Count strophes per canticum
-            canticum_counts = {}
-            for strophe in root.xpath('//strophe[@responsion]'):
-                resp_id = strophe.get('responsion')
-                if id and not resp_id.startswith(id):
-                    continue
-                canticum_counts[resp_id] = canticum_counts.get(resp_id, 0) + 1
+            # Count strophes per canticum, streaming so that no tree is built for the count
+            canticum_counts = count_responsions_streaming(file_path, prefix=id)
 
             # Filter based on mode
             if mode == "polystrophic":
@@ -409,10 +480,15 @@ def compatibility_strophicity(dir_path="compiled", mode="antistrophic", id="", f
             elif mode == "four-strophic":
                 filtered_cantica = [cid for cid, count in canticum_counts.items() if count == 4]
 
+            # Only build the full tree for files that have cantica of the wanted kind
+            if not filtered_cantica:
+                continue
+            root = etree.parse(file_path).getroot()
+
             # Process filtered cantica
             play_results = []
             for canticum_id in filtered_cantica:
-                result = compatibility_canticum(file_path, canticum_id, fractional=fractional)
+                result = compatibility_canticum(root, canticum_id, fractional=fractional)
                 play_results.append(result)
 
             if play_results:
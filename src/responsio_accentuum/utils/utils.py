@@ -25,6 +25,24 @@ def _resolve_path(path_like: str | Path) -> Path:
     path = Path(path_like)
     return path if path.is_absolute() else _ROOT / path
 
+
+def parse_xml_root(xml_source, resolve: bool = False, parser=None):
+    '''
+    Returns the root element of xml_source, which is either a path
+    or an already parsed tree or element. Passing the parsed root along
+    lets a caller that works through many cantica of one file parse it only once.
+
+    resolve: resolve relative paths against the project root (cf. _resolve_path)
+    parser: an etree.XMLParser to parse paths with, instead of the default one
+    '''
+    if isinstance(xml_source, etree._ElementTree):
+        return xml_source.getroot()
+    if isinstance(xml_source, etree._Element):
+        return xml_source
+    if resolve:
+        xml_source = _resolve_path(xml_source)
+    return etree.parse(xml_source, parser).getroot()
+
 #################################
 ### General utility functions ###
 #################################
@@ -56,23 +74,47 @@ def clean_tei_text(input_xml_file, output_xml_file):
 
     tree.write(output_xml_file, encoding="utf-8", xml_declaration=True)
 
+_to_clean = re.compile(r'[\u0387\u037e\u00b7\.,!?;:\"()\[\]{}<>«»⌞⌟\-—…|⏑⏓†×]') # NOTE hyphens must be escaped
+
 def clean_text(text: str) -> str:
-    to_clean = r'[\u0387\u037e\u00b7\.,!?;:\"()\[\]{}<>«»⌞⌟\-—…|⏑⏓†×]' # NOTE hyphens must be escaped
-    cleaned_text = re.sub(to_clean, '', text)
+    cleaned_text = _to_clean.sub('', text)
     return cleaned_text
 
 def get_canticum_ids(file_path: str) -> list[str]:
     all_ids = []
 
     file_path = _resolve_path(file_path)
-    tree = etree.parse(file_path)
-    root = tree.getroot()
-    strophe_elements = root.xpath("//strophe")
-    all_ids.extend(strophe.get("responsion") for strophe in strophe_elements)
+
+    # Only the strophe attributes are needed, so stream through the file
+    # and drop each strophe once read, instead of building the whole tree
+    for _, strophe in etree.iterparse(str(file_path), events=("end",), tag="strophe"):
+        all_ids.append(strophe.get("responsion"))
+        strophe.clear()
+        while strophe.getprevious() is not None:
+            del strophe.getparent()[0]
 
     seen = set()
     return [x for x in all_ids if x not in seen and not seen.add(x)]
 
+def count_responsions_streaming(file_path: str, prefix: str = "", tags=("strophe",)) -> Counter:
+    '''
+    Counts the strophes per responsion attribute without building the whole tree.
+
+    prefix: only count responsion ids starting with this string
+    tags: the elements to count, e.g. ("strophe", "antistrophe")
+    '''
+    counts = Counter()
+
+    for _, strophe in etree.iterparse(str(file_path), events=("end",), tag=tags):
+        resp_id = strophe.get("responsion")
+        if resp_id is not None and resp_id.startswith(prefix):
+            counts[resp_id] += 1
+        strophe.clear()
+        while strophe.getprevious() is not None:
+            del strophe.getparent()[0]
+
+    return counts
+
 # def get_syll_count(canticum_ids):
 #     syll_count = {}
 #     for abbreviation in abbreviations:
@@ -87,27 +129,23 @@ def get_canticum_ids(file_path: str) -> list[str]:
 #     return syll_count
 
 def canticum_with_at_least_two_strophes(xml_file, responsion_attribute: str):
-    xml_file = _resolve_path(xml_file)
-    tree = etree.parse(xml_file)
-    root = tree.getroot()
+    root = parse_xml_root(xml_file, resolve=True)
 
-    strophes = root.findall(f".//strophe[@responsion='{responsion_attribute}']")
+    # Stop at the second match instead of collecting every strophe of the canticum
+    strophes = (strophe for strophe in root.iter("strophe") if strophe.get("responsion") == responsion_attribute)
 
-    return len(strophes) >= 2
+    return next(strophes, None) is not None and next(strophes, None) is not None
 
 def get_strophicity(abbreviations):
     responsion_counts = Counter()
 
     for abbreviation in abbreviations:
         file_path = _resolve_path(f"data/compiled/responsion_{abbreviation}_compiled.xml")
-        tree = etree.parse(file_path)
-        root = tree.getroot()
 
-        elements = root.xpath("//strophe[@responsion]") + root.xpath("//antistrophe[@responsion]")
-        for el in elements:
-            rid = el.get("responsion")
-            if rid:
-                responsion_counts[rid] += 1
+        # Only the responsion attributes are needed, so the file is streamed rather than parsed whole
+        responsion_counts += count_responsions_streaming(file_path, tags=("strophe", "antistrophe"))
+
+    responsion_counts.pop("", None) # an empty responsion attribute belongs to no canticum
 
     more_than_two = [rid for rid, count in responsion_counts.items() if count > 2]
     exactly_two = [rid for rid, count in responsion_counts.items() if count == 2]
@@ -120,14 +158,12 @@ def get_text_matrix(xml_filepath: str, responsion_attribute: str, representative
     of the text of the first strophe in the given XML file,
     so it can be superpositioned over a heatmap.
 
-    xml_filepath: path to the XML file
+    xml_filepath: path to the XML file, or its already parsed root
     responsion_attribute: the value of the responsion attribute of the song in question
     representative_strophe: 1-based index of the strophe whose text to use
     '''
     # Load XML
-    xml_filepath = _resolve_path(xml_filepath)
-    tree = etree.parse(xml_filepath)
-    root = tree.getroot()
+    root = parse_xml_root(xml_filepath, resolve=True)
 
     desired_strophes = root.findall(f".//strophe[@responsion='{responsion_attribute}']")
     picked_strophe = desired_strophes[representative_strophe - 1] if desired_strophes else None